@@ -0,0 +1,202 @@
+import json
+import subprocess
+
+import numpy as np
+import soundfile as sf
+
+# Frames copied per step when a file's channel layout needs remapping
+BLOCK_FRAMES = 65536
+
+# Spleeter separates (samples, 2) float32 waveforms
+CHANNELS = 2
+
+
+def allocate_waveform(frames):
+    """Preallocate a C-contiguous (frames, 2) float32 buffer"""
+    return np.empty((max(frames, 0), CHANNELS), dtype=np.float32, order='C')
+
+
+def decode_with_soundfile(audio_file):
+    """
+    Decode with libsndfile straight into the Spleeter layout.
+
+    Stereo files are read directly into the preallocated buffer. Mono and
+    multichannel files are remapped block by block (mono duplicated, extra
+    channels dropped), so there is never a second full-length copy.
+    """
+    with sf.SoundFile(audio_file) as source:
+        sample_rate = source.samplerate
+        waveform = allocate_waveform(source.frames)
+
+        if source.channels == CHANNELS:
+            frames = source.read(source.frames, dtype='float32', out=waveform)
+            return waveform[:len(frames)], sample_rate
+
+        position = 0
+        for block in source.blocks(blocksize=BLOCK_FRAMES, dtype='float32', always_2d=True):
+            end = position + len(block)
+            if source.channels == 1:
+                waveform[position:end] = block
+            else:
+                waveform[position:end] = block[:, :CHANNELS]
+            position = end
+
+    return waveform[:position], sample_rate
+
+
+def probe_audio(audio_file, ffprobe_path='ffprobe'):
+    """Return (sample_rate, channels, duration) of the first audio stream"""
+    cmd = [
+        ffprobe_path,
+        '-v', 'error',
+        '-select_streams', 'a:0',
+        '-show_entries', 'stream=sample_rate,channels:format=duration',
+        '-of', 'json',
+        audio_file
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe failed: {result.stderr.strip()}")
+
+    data = json.loads(result.stdout)
+    streams = data.get('streams') or []
+    if not streams:
+        raise RuntimeError(f"No audio stream found in '{audio_file}'")
+
+    stream = streams[0]
+    duration = float(data.get('format', {}).get('duration') or 0.0)
+    return int(stream['sample_rate']), int(stream.get('channels', CHANNELS)), duration
+
+
+def ffmpeg_decode_command(audio_file, channels, ffmpeg_path='ffmpeg'):
+    """ffmpeg arguments that write native-rate stereo float32 PCM to stdout"""
+    cmd = [ffmpeg_path, '-v', 'error', '-i', audio_file, '-vn']
+    if channels > CHANNELS:
+        # Keep the first two channels rather than downmixing, like the soundfile path
+        cmd += ['-af', 'pan=stereo|c0=c0|c1=c1']
+    else:
+        cmd += ['-ac', str(CHANNELS)]
+    return cmd + ['-f', 'f32le', '-acodec', 'pcm_f32le', 'pipe:1']
+
+
+def decode_with_ffmpeg(audio_file, ffmpeg_path='ffmpeg', ffprobe_path='ffprobe'):
+    """
+    Stream native-rate float PCM from ffmpeg into a preallocated buffer.
+
+    The buffer is sized from the probed duration and only grows when the
+    estimate falls short, which happens for some VBR MP3s.
+    """
+    sample_rate, channels, duration = probe_audio(audio_file, ffprobe_path)
+    cmd = ffmpeg_decode_command(audio_file, channels, ffmpeg_path)
+
+    # Small headroom over the probed length avoids a regrow on rounding
+    waveform = allocate_waveform(int(duration * sample_rate) + sample_rate)
+    filled = 0
+
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            if filled == waveform.nbytes:
+                grown = allocate_waveform(len(waveform) * 2)
+                grown[:len(waveform)] = waveform
+                waveform = grown
+
+            view = memoryview(waveform.reshape(-1)).cast('B')[filled:]
+            count = process.stdout.readinto(view)
+            if not count:
+                break
+            filled += count
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read().decode(errors='replace')
+        process.stderr.close()
+        returncode = process.wait()
+
+    if returncode != 0:
+        raise RuntimeError(f"ffmpeg decode failed: {stderr.strip()}")
+
+    return waveform[:filled // (4 * CHANNELS)], sample_rate
+
+
+def decode_audio(audio_file):
+    """
+    Decode ``audio_file`` at its native rate into a C-contiguous (samples, 2)
+    float32 array, ready to hand to ``Separator.separate`` without copies.
+
+    libsndfile is used when it understands the container (WAV, FLAC, OGG and,
+    with libsndfile >= 1.1, MP3). Everything else (AAC, M4A, ...) is piped
+    through ffmpeg.
+    """
+    try:
+        return decode_with_soundfile(audio_file)
+    except RuntimeError:
+        return decode_with_ffmpeg(audio_file)
+
+
+class FFmpegAudioStream:
+    """
+    Read-as-you-go ffmpeg decode with the subset of the ``sf.SoundFile``
+    interface the streaming separation uses (``samplerate``, ``channels``,
+    ``frames``, ``read`` and ``tell``).
+
+    ``frames`` is estimated from the probed duration, so readers detect the
+    end of the stream by a short read rather than by comparing against it.
+    """
+
+    def __init__(self, audio_file, ffmpeg_path='ffmpeg', ffprobe_path='ffprobe'):
+        self.samplerate, source_channels, duration = probe_audio(audio_file, ffprobe_path)
+        self.channels = CHANNELS
+        self.frames = int(duration * self.samplerate)
+        self._position = 0
+        self._process = subprocess.Popen(
+            ffmpeg_decode_command(audio_file, source_channels, ffmpeg_path),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+
+    def read(self, frames, dtype='float32', always_2d=True):
+        block = allocate_waveform(frames)
+        view = memoryview(block.reshape(-1)).cast('B')
+        filled = 0
+        while filled < len(view):
+            count = self._process.stdout.readinto(view[filled:])
+            if not count:
+                break
+            filled += count
+
+        frames_read = filled // (4 * CHANNELS)
+        self._position += frames_read
+        return block[:frames_read].astype(dtype, copy=False)
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        process = self._process
+        if process.stdout.closed:
+            return
+        finished = process.poll() is not None or not process.stdout.read(1)
+        process.stdout.close()
+        if not finished:
+            process.kill()
+        stderr = process.stderr.read().decode(errors='replace')
+        process.stderr.close()
+        returncode = process.wait()
+        if finished and returncode != 0:
+            raise RuntimeError(f"ffmpeg decode failed: {stderr.strip()}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_audio_stream(audio_file):
+    """
+    Open ``audio_file`` for windowed reading: libsndfile when it understands
+    the container, otherwise an ffmpeg pipe (AAC, M4A, ...), as in ``decode_audio``.
+    """
+    try:
+        return sf.SoundFile(audio_file)
+    except RuntimeError:
+        return FFmpegAudioStream(audio_file)
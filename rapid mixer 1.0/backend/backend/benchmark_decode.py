@@ -0,0 +1,162 @@
+"""
+Compare decode time and peak RSS of the decoders feeding Spleeter.
+
+    python benchmark_decode.py song.mp3 other.wav --repeat 3
+    python benchmark_decode.py --synthesize 300
+
+Each measurement runs in a fresh interpreter, so peak RSS reflects only the
+decoder being measured. Methods:
+
+    librosa    the previous path: librosa.load + mono stacking + transpose,
+               made C-contiguous as Spleeter's feed requires
+    soundfile  audio_decode.decode_with_soundfile
+    ffmpeg     audio_decode.decode_with_ffmpeg
+    auto       audio_decode.decode_audio (what process_audio.py uses)
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import resource
+import statistics
+import subprocess
+import tempfile
+
+METHODS = ('librosa', 'soundfile', 'ffmpeg', 'auto')
+
+
+def peak_rss_mb():
+    # Linux keeps ru_maxrss across fork/exec, so a child would inherit the
+    # parent's peak; VmHWM belongs to the current address space only.
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def decode_librosa(audio_file):
+    import numpy as np
+    import librosa
+
+    audio, sample_rate = librosa.load(audio_file, sr=None, mono=False)
+    if audio.ndim == 1:
+        audio = np.stack([audio, audio])
+    elif audio.ndim == 2 and audio.shape[0] > 2:
+        audio = audio[:2]
+    return np.ascontiguousarray(audio.T), sample_rate
+
+
+def run_child(method, audio_file):
+    """Decode once in this process and print one JSON result line"""
+    import audio_decode
+
+    decoders = {
+        'librosa': decode_librosa,
+        'soundfile': audio_decode.decode_with_soundfile,
+        'ffmpeg': audio_decode.decode_with_ffmpeg,
+        'auto': audio_decode.decode_audio,
+    }
+    baseline_rss = peak_rss_mb()
+
+    start = time.perf_counter()
+    waveform, sample_rate = decoders[method](audio_file)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        'seconds': elapsed,
+        'peak_rss_mb': peak_rss_mb(),
+        'decode_rss_mb': peak_rss_mb() - baseline_rss,
+        'frames': int(waveform.shape[0]),
+        'sample_rate': int(sample_rate),
+        'audio_seconds': waveform.shape[0] / sample_rate,
+    }))
+
+
+def measure(method, audio_file):
+    cmd = [sys.executable, os.path.abspath(__file__), '--child', method, audio_file]
+    result = subprocess.run(cmd, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'failed'}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def synthesize(seconds, directory):
+    """Write a stereo WAV (and an MP3 when ffmpeg is available) of ``seconds`` length"""
+    import numpy as np
+    import soundfile as sf
+
+    sample_rate = 44100
+    t = np.arange(int(seconds * sample_rate), dtype=np.float32) / sample_rate
+    left = 0.4 * np.sin(2 * np.pi * 220.0 * t)
+    right = 0.4 * np.sin(2 * np.pi * 330.0 * t)
+    wav_path = os.path.join(directory, f'synth_{int(seconds)}s.wav')
+    sf.write(wav_path, np.stack([left, right], axis=1), sample_rate, subtype='PCM_16')
+
+    paths = [wav_path]
+    mp3_path = wav_path[:-4] + '.mp3'
+    try:
+        subprocess.run(['ffmpeg', '-v', 'error', '-y', '-i', wav_path, '-b:a', '192k', mp3_path],
+                       check=True, capture_output=True)
+        paths.append(mp3_path)
+    except (OSError, subprocess.CalledProcessError):
+        print("ffmpeg not available, skipping MP3 input", file=sys.stderr)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark audio decoders for process_audio.py")
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--synthesize', type=float, metavar='SECONDS',
+                        help="Generate test inputs of this length instead of/in addition to files")
+    parser.add_argument('--methods', default=','.join(METHODS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--child', nargs=2, metavar=('METHOD', 'FILE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    files = list(args.files)
+    temp_dir = None
+    if args.synthesize:
+        temp_dir = tempfile.TemporaryDirectory(prefix='decode_bench_')
+        files += synthesize(args.synthesize, temp_dir.name)
+    if not files:
+        parser.error("no input files (pass paths or --synthesize SECONDS)")
+
+    report = []
+    for audio_file in files:
+        for method in args.methods.split(','):
+            runs = [measure(method, audio_file) for _ in range(args.repeat)]
+            ok = [run for run in runs if 'error' not in run]
+            entry = {'file': audio_file, 'method': method}
+            if ok:
+                entry.update({
+                    'seconds': statistics.median(run['seconds'] for run in ok),
+                    'peak_rss_mb': max(run['peak_rss_mb'] for run in ok),
+                    'decode_rss_mb': max(run['decode_rss_mb'] for run in ok),
+                    'audio_seconds': ok[0]['audio_seconds'],
+                })
+            else:
+                entry['error'] = runs[0]['error']
+            report.append(entry)
+            print(json.dumps(entry), file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+
+    if temp_dir is not None:
+        temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
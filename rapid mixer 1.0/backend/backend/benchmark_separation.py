@@ -0,0 +1,237 @@
+"""
+End-to-end throughput benchmark of the process_audio.py separation path.
+
+    python benchmark_separation.py
+    python benchmark_separation.py --rates 44100 --layouts stereo --durations 30,300 --stream
+    python benchmark_separation.py --output run.json --baseline previous.json
+
+Test tracks are synthesized locally (a few sines plus filtered noise per
+channel) for every combination of sample rate, channel layout and duration.
+Each case is separated in a fresh interpreter through separate_file, with
+the stem cache disabled, and reports:
+
+    model_seconds     building the Spleeter separator
+    decode_seconds    decoding the input (opening it, in streaming mode)
+    separate_seconds  the model pass(es)
+    write_seconds     level analysis, normalization and encoding the stems
+    peak_rss_mb       peak resident memory of the child process
+    realtime_factor   processing seconds (without model load) per audio second
+
+The JSON report goes to stdout (or --output). With --baseline, cases whose
+processing time grew by more than --tolerance are listed as regressions and
+the exit status is 1.
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+from benchmark_decode import peak_rss_mb
+
+LAYOUTS = {
+    'mono': 1,
+    'stereo': 2,
+    '5.1': 6,
+}
+
+# Frames synthesized and written per step, so long tracks never sit in memory
+SYNTH_BLOCK_SECONDS = 10
+
+
+def synthesize(path, seconds, sample_rate, channels, seed=0):
+    """Write a PCM_16 WAV of sines plus low-passed noise, different per channel"""
+    import numpy as np
+    import soundfile as sf
+    from scipy.signal import lfilter
+
+    rng = np.random.default_rng(seed)
+    frequencies = [110.0, 220.0, 330.0, 440.0, 660.0, 880.0]
+    total_frames = int(seconds * sample_rate)
+    block_frames = SYNTH_BLOCK_SECONDS * sample_rate
+    noise_state = np.zeros((1, channels))
+
+    with sf.SoundFile(path, 'w', samplerate=sample_rate, channels=channels, subtype='PCM_16') as out:
+        for start in range(0, total_frames, block_frames):
+            frames = min(block_frames, total_frames - start)
+            t = np.arange(start, start + frames, dtype=np.float64) / sample_rate
+            # A fifth above the base tone that switches on and off every second
+            gate = np.sin(2 * np.pi * 0.5 * t) > 0
+
+            block = np.empty((frames, channels), dtype=np.float32)
+            for channel in range(channels):
+                tone = frequencies[channel % len(frequencies)]
+                block[:, channel] = 0.2 * np.sin(2 * np.pi * tone * t) \
+                    + 0.1 * gate * np.sin(2 * np.pi * tone * 1.5 * t)
+
+            # One-pole low-passed noise; the filter state carries across blocks
+            noise, noise_state = lfilter([0.1], [1.0, -0.9],
+                                         rng.standard_normal((frames, channels)) * 0.5,
+                                         axis=0, zi=noise_state)
+            block += noise.astype(np.float32)
+            out.write(block)
+    return path
+
+
+def run_child(spec):
+    """Separate one synthesized track in this process and print one JSON result line"""
+    import process_audio
+
+    spec = json.loads(spec)
+    options = process_audio.build_parser().parse_args([
+        '--model', spec['model'],
+        '--formats', spec['formats'],
+        '--no-cache',
+    ] + (['--stream'] if spec['stream'] else []))
+
+    separators = process_audio.SeparatorPool()
+    start = time.perf_counter()
+    separators.get(process_audio.parse_model(spec['model']))
+    model_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    metadata = process_audio.separate_file(
+        separators, spec['input'], spec['output_dir'], 'bench', options
+    )
+    processing_seconds = time.perf_counter() - start
+
+    timings = metadata['timings']
+    duration = metadata['duration']
+    print(json.dumps({
+        'model_seconds': model_seconds,
+        'decode_seconds': timings.get('decode', 0.0),
+        'separate_seconds': timings.get('separate', 0.0),
+        'write_seconds': timings.get('write', 0.0),
+        'processing_seconds': processing_seconds,
+        'peak_rss_mb': peak_rss_mb(),
+        'audio_seconds': duration,
+        'realtime_factor': processing_seconds / duration if duration else None,
+    }))
+
+
+def measure(spec):
+    cmd = [sys.executable, os.path.abspath(__file__), '--child', json.dumps(spec)]
+    result = subprocess.run(cmd, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'failed'}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def case_name(sample_rate, layout, seconds):
+    return f"{sample_rate}Hz-{layout}-{seconds:g}s"
+
+
+def find_regressions(report, baseline_path, tolerance):
+    """Cases whose processing time exceeds the baseline run by more than ``tolerance``"""
+    with open(baseline_path) as f:
+        baseline = {entry['case']: entry for entry in json.load(f)['cases']}
+
+    regressions = []
+    for entry in report['cases']:
+        previous = baseline.get(entry['case'])
+        if not previous or 'error' in entry or 'error' in previous:
+            continue
+        ratio = entry['processing_seconds'] / previous['processing_seconds']
+        if ratio > 1 + tolerance:
+            regressions.append({
+                'case': entry['case'],
+                'processing_seconds': entry['processing_seconds'],
+                'baseline_seconds': previous['processing_seconds'],
+                'ratio': round(ratio, 3),
+            })
+    return regressions
+
+
+def parse_list(value, cast):
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark process_audio.py separation throughput")
+    parser.add_argument('--rates', default='22050,44100,48000')
+    parser.add_argument('--layouts', default=','.join(LAYOUTS))
+    parser.add_argument('--durations', default='30,120,600', help="Track lengths in seconds")
+    parser.add_argument('--model', default='5stems-16kHz')
+    parser.add_argument('--formats', default='wav')
+    parser.add_argument('--stream', action='store_true', help="Use bounded-memory streaming separation")
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    parser.add_argument('--baseline', help="Previous JSON report to compare processing times against")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="Allowed slowdown against the baseline (default: 0.15 = 15%%)")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child)
+        return 0
+
+    layouts = parse_list(args.layouts, str)
+    unknown = [layout for layout in layouts if layout not in LAYOUTS]
+    if unknown:
+        parser.error(f"unknown layout(s): {', '.join(unknown)}; choose from {', '.join(LAYOUTS)}")
+
+    cases = []
+    with tempfile.TemporaryDirectory(prefix='separation_bench_') as temp_dir:
+        output_dir = os.path.join(temp_dir, 'stems')
+        for sample_rate in parse_list(args.rates, int):
+            for layout in layouts:
+                for seconds in parse_list(args.durations, float):
+                    name = case_name(sample_rate, layout, seconds)
+                    input_path = synthesize(os.path.join(temp_dir, f"{name}.wav"),
+                                            seconds, sample_rate, LAYOUTS[layout])
+                    spec = {
+                        'input': input_path,
+                        'output_dir': output_dir,
+                        'model': args.model,
+                        'formats': args.formats,
+                        'stream': args.stream,
+                    }
+                    runs = [measure(spec) for _ in range(args.repeat)]
+                    os.remove(input_path)
+
+                    ok = [run for run in runs if 'error' not in run]
+                    entry = {'case': name, 'sample_rate': sample_rate,
+                             'layout': layout, 'seconds': seconds}
+                    if ok:
+                        for key in ('model_seconds', 'decode_seconds', 'separate_seconds',
+                                    'write_seconds', 'processing_seconds', 'realtime_factor'):
+                            entry[key] = statistics.median(run[key] for run in ok)
+                        entry['peak_rss_mb'] = max(run['peak_rss_mb'] for run in ok)
+                    else:
+                        entry['error'] = runs[0]['error']
+                    cases.append(entry)
+                    print(json.dumps(entry), file=sys.stderr)
+
+    report = {
+        'model': args.model,
+        'mode': 'streaming' if args.stream else 'full',
+        'formats': args.formats,
+        'repeat': args.repeat,
+        'python': sys.version.split()[0],
+        'cpu_count': os.cpu_count(),
+        'cases': cases,
+    }
+
+    status = 0
+    if args.baseline:
+        report['regressions'] = find_regressions(report, args.baseline, args.tolerance)
+        for regression in report['regressions']:
+            print(f"Regression: {regression['case']} took {regression['processing_seconds']:.2f}s "
+                  f"vs {regression['baseline_seconds']:.2f}s ({regression['ratio']}x)", file=sys.stderr)
+        status = 1 if report['regressions'] else 0
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,4 @@
-const { spawn } = require('child_process');
+const spleeterWorker = require('../services/spleeterWorker');
 const db = require('../services/database');
 
 const sampleTracks = [
@@ -57,19 +57,14 @@ exports.uploadAudio = (req, res, next) => {
         return next(error);
     }
 
-    const pythonProcess = spawn('python', ['process_audio.py', req.file.path, 'uploads/stems']);
+    const processId = spleeterWorker.newProcessId();
 
-    pythonProcess.stdout.on('data', (data) => {
-        console.log(`Python script output: ${data}`);
-    });
-
-    pythonProcess.stderr.on('data', (data) => {
-        console.error(`Error from Python script: ${data}`);
-    });
+    // Optional model tier, e.g. '2stems' when only vocals/accompaniment are needed
+    const options = req.body && req.body.model ? { model: req.body.model } : {};
 
-    pythonProcess.on('close', (code) => {
-        console.log(`Python script exited with code ${code}`);
-        if (code === 0) {
+    spleeterWorker.process(req.file.path, 'uploads/stems', processId, options)
+        .then(() => {
+            console.log(`Spleeter job ${processId} completed`);
             const { originalname, path, size } = req.file;
             const format = originalname.split('.').pop();
             db.run(`INSERT INTO recent_files (name, path, size, format) VALUES (?, ?, ?, ?)`,
@@ -80,14 +75,16 @@ exports.uploadAudio = (req, res, next) => {
                     }
                     res.status(200).json({ 
                         message: 'File processed and logged successfully',
-                        fileId: this.lastID
+                        fileId: this.lastID,
+                        processId
                     });
                 }
             );
-        } else {
+        })
+        .catch(() => {
+            console.error(`Spleeter job ${processId} failed`);
             const error = new Error('Error processing audio file.');
             error.status = 500;
             return next(error);
-        }
-    });
+        });
 };
\ No newline at end of file
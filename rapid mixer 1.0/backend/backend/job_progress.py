@@ -0,0 +1,103 @@
+import sys
+import json
+import time
+import threading
+
+# Stdout prefix of progress events; each is followed by one JSON object
+PROGRESS_MARKER = 'SPLEETER_PROGRESS:'
+
+# Share of the overall progress each phase accounts for
+PHASE_WEIGHTS = {
+    'decode': 0.1,
+    'separate': 0.7,
+    'write': 0.2,
+}
+
+
+class ProgressReporter:
+    """
+    Emit newline-delimited JSON progress events for one separation job.
+
+    Every event is printed as ``SPLEETER_PROGRESS:{...}`` with the job id,
+    phase, event type (``start``, ``step``, ``end`` or ``done``), a wall
+    clock timestamp and the overall progress in [0, 1]. ``end`` events carry
+    the phase duration, and the final ``done`` event lists all of them.
+    Steps may be reported from several writer threads at once.
+    """
+
+    def __init__(self, process_id, stream=None, enabled=True):
+        self.process_id = process_id
+        self.stream = stream
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.phase_started = {}
+        self.phase_fraction = {}
+        self.phase_done = {}
+        self.durations = {}
+
+    def overall(self):
+        return round(sum(
+            weight * self.phase_fraction.get(phase, 0.0)
+            for phase, weight in PHASE_WEIGHTS.items()
+        ), 4)
+
+    def _emit(self, event, phase=None, **fields):
+        if not self.enabled:
+            return
+        payload = {
+            'process_id': self.process_id,
+            'event': event,
+            'phase': phase,
+            'progress': self.overall(),
+            'timestamp': round(time.time(), 3),
+        }
+        payload.update(fields)
+        stream = self.stream or sys.stdout
+        stream.write(PROGRESS_MARKER + json.dumps(payload) + '\n')
+        stream.flush()
+
+    def start(self, phase, total=None):
+        with self.lock:
+            self.phase_started[phase] = time.time()
+            self.phase_fraction[phase] = 0.0
+            self._emit('start', phase, total=total)
+
+    def step(self, phase, done, total, **fields):
+        with self.lock:
+            self._step(phase, done, total, **fields)
+
+    def _step(self, phase, done, total, **fields):
+        self.phase_fraction[phase] = min(done / total, 1.0) if total else 1.0
+        self._emit('step', phase, done=done, total=total, **fields)
+
+    def advance(self, phase, total, **fields):
+        """Count one more finished unit of ``phase``, e.g. a stem written by a pool thread"""
+        # Counted and emitted under one lock, so ``done`` never goes backwards
+        with self.lock:
+            done = self.phase_done.get(phase, 0) + 1
+            self.phase_done[phase] = done
+            self._step(phase, done, total, **fields)
+
+    def end(self, phase, **fields):
+        with self.lock:
+            now = time.time()
+            duration = round(now - self.phase_started.get(phase, now), 3)
+            self.durations[phase] = duration
+            self.phase_fraction[phase] = 1.0
+            self._emit('end', phase, duration=duration, **fields)
+
+    def finish(self, status, **fields):
+        """Mark the job finished; skipped phases (e.g. on a cache hit) count as done"""
+        with self.lock:
+            if status == 'completed':
+                for phase in PHASE_WEIGHTS:
+                    self.phase_fraction[phase] = 1.0
+            self._emit('done', status=status,
+                       duration=round(time.time() - self.started_at, 3),
+                       phases=dict(self.durations), **fields)
+
+    def timings(self):
+        """Phase durations so far, plus the total, for the job metadata"""
+        with self.lock:
+            return dict(self.durations, total=round(time.time() - self.started_at, 3))
@@ -1,125 +1,792 @@
 import sys
 import os
-import librosa
+import argparse
 import soundfile as sf
 import numpy as np
-from spleeter.separator import Separator
 import json
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def main():
-    if len(sys.argv) != 4:
-        print("Usage: python process_audio.py <audio_file_path> <output_directory> <process_id>")
-        sys.exit(1)
-    
-    audio_file = sys.argv[1]
-    output_dir = sys.argv[2]
-    process_id = sys.argv[3]
-    
-    if not os.path.exists(audio_file):
-        print(f"Error: Audio file '{audio_file}' not found.")
-        sys.exit(1)
-    
+from audio_decode import decode_audio, open_audio_stream
+from job_progress import ProgressReporter
+from stem_cache import StemCache, temp_path
+from stem_levels import LevelMeter, NORMALIZE_MODES, measure_stem, normalization_gains
+
+USAGE = (
+    "Usage: python process_audio.py [options] <audio_file_path> <output_directory> <process_id>\n"
+    "       python process_audio.py --worker [options]\n"
+    "       python process_audio.py --batch <manifest.jsonl> [options]"
+)
+
+
+# Pretrained Spleeter models: stem count and whether the model stops at 11kHz
+# (the "-16kHz" variants) or covers the full band. Fewer stems is much faster.
+MODELS = {
+    '2stems': ('vocals', 'accompaniment'),
+    '2stems-16kHz': ('vocals', 'accompaniment'),
+    '4stems': ('vocals', 'drums', 'bass', 'other'),
+    '4stems-16kHz': ('vocals', 'drums', 'bass', 'other'),
+    '5stems': ('vocals', 'drums', 'bass', 'piano', 'other'),
+    '5stems-16kHz': ('vocals', 'drums', 'bass', 'piano', 'other'),
+}
+
+DEFAULT_MODEL = '5stems-16kHz'
+
+
+def parse_model(value):
+    """Accept ``4stems`` or ``spleeter:4stems`` and reject unknown models"""
+    model = str(value or DEFAULT_MODEL)
+    if model.startswith('spleeter:'):
+        model = model[len('spleeter:'):]
+    if model not in MODELS:
+        raise ValueError(f"Unsupported model '{value}', expected one of: {', '.join(MODELS)}")
+    return model
+
+
+def create_separator(model=DEFAULT_MODEL):
+    """Build the Spleeter separator (the expensive TensorFlow graph load)"""
+    # Imported here so cache hits never pay the TensorFlow import either
+    from spleeter.separator import Separator
+
+    print(f"Initializing Spleeter with {model} model...")
+    return Separator(f'spleeter:{model}')
+
+
+class SeparatorPool:
+    """
+    Separators keyed by model, each built on first use.
+
+    The worker keeps every model it has loaded, so cheap 2-stem requests and
+    full 5-stem requests can be interleaved without reloading graphs, and
+    cache hits never load a model at all.
+    """
+
+    def __init__(self):
+        self._separators = {}
+
+    def get(self, model=DEFAULT_MODEL):
+        model = parse_model(model)
+        if model not in self._separators:
+            self._separators[model] = create_separator(model)
+        return self._separators[model]
+
+    def loaded(self):
+        return list(self._separators)
+
+
+def to_stereo(audio):
+    """Coerce a (samples, channels) block to the two channels Spleeter separates"""
+    if audio.shape[1] == 1:
+        return np.repeat(audio, 2, axis=1)
+    if audio.shape[1] > 2:
+        return audio[:, :2]  # Take first 2 channels
+    return audio
+
+
+# Output encodings a stem can be written in; the first requested one is the
+# primary file reported under ``stems`` in the metadata
+OUTPUT_FORMATS = {
+    'wav': {'format': 'WAV', 'subtype': 'PCM_24'},  # 24-bit for high quality
+    'flac': {'format': 'FLAC', 'subtype': 'PCM_24'},
+    'ogg': {'format': 'OGG', 'subtype': 'VORBIS'},
+}
+
+
+def output_quality(fmt):
+    """Describe the encoding ``fmt`` is written with, e.g. ``24-bit/high`` for PCM_24"""
+    subtype = OUTPUT_FORMATS[fmt]['subtype']
+    if subtype.startswith('PCM_'):
+        bits = int(subtype[len('PCM_'):])
+        return f"{bits}-bit/{'high' if bits >= 24 else 'standard'}"
+    return f"{subtype.lower()}/lossy"
+
+
+def parse_formats(value):
+    """Accept ``"wav,flac"`` from the CLI or ``["wav", "flac"]`` from a job line"""
+    if isinstance(value, str):
+        value = value.split(',')
+    formats = [fmt.strip().lower() for fmt in value if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in OUTPUT_FORMATS]
+    if unknown or not formats:
+        raise ValueError(f"Unsupported output format(s): {unknown or value}")
+    return tuple(dict.fromkeys(formats))
+
+
+def clean_stem_name(stem_name):
+    """Clean stem name for filename"""
+    return stem_name.replace('/', '_').replace('\\', '_')
+
+
+def stem_output_paths(output_dir, process_id, clean_name, formats):
+    return {
+        fmt: os.path.join(output_dir, f"{process_id}_{clean_name}.{fmt}")
+        for fmt in formats
+    }
+
+
+def write_stem(stem_name, stem_audio, paths, sample_rate, gain=1.0):
+    """Scale one stem in place by its normalization gain and write every requested format"""
+    print(f"Saving {stem_name} to {', '.join(paths.values())}")
+
+    if gain != 1.0:
+        stem_audio *= np.float32(gain)
+
+    for fmt, path in paths.items():
+        # Replace rather than overwrite: the old file may be linked from the stem cache
+        staging = temp_path(path)
+        sf.write(staging, stem_audio, samplerate=sample_rate, **OUTPUT_FORMATS[fmt])
+        os.replace(staging, path)
+
+    print(f"✓ {stem_name} saved successfully")
+
+
+def run_parallel(tasks, workers):
+    """
+    Run independent callables on a thread pool and return their results in order.
+
+    soundfile and the numpy kernels release the GIL, so stem writes overlap
+    on multi-core machines. The first failure is re-raised.
+    """
+    if workers <= 1 or len(tasks) <= 1:
+        return [task() for task in tasks]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(task) for task in tasks]
+        return [future.result() for future in futures]
+
+
+def load_audio(audio_file):
+    """Decode ``audio_file`` into a (samples, 2) waveform in Spleeter's layout"""
+    print("Loading audio file...")
+    waveform, sample_rate = decode_audio(audio_file)
+    print(f"Audio loaded: {waveform.shape}, Sample rate: {sample_rate}")
+    return waveform, sample_rate
+
+
+def separate_in_memory(separator, audio_file, output_dir, process_id,
+                       formats=('wav',), write_workers=1, decoded=None,
+                       normalize='stem', headroom=0.95, progress=None):
+    """
+    Decode the whole file, separate it in one call and write every stem.
+
+    ``decoded`` may carry a ``(waveform, sample_rate)`` pair that was already
+    produced by ``load_audio``, e.g. by the batch prefetcher. Returns the
+    written files, sample rate, duration and the per-stem levels report.
+    """
+    progress = progress or ProgressReporter(process_id, enabled=False)
+
+    progress.start('decode')
+    waveform, sample_rate = decoded if decoded is not None else load_audio(audio_file)
+    progress.end('decode', prefetched=decoded is not None,
+                 frames=len(waveform), sample_rate=int(sample_rate))
+
+    # Perform separation
+    print("Starting stem separation...")
+    progress.start('separate', total=1)
+    prediction = separator.separate(waveform)
+    progress.step('separate', 1, 1)
+    progress.end('separate')
+
+    progress.start('write', total=len(prediction))
+
+    # Own writable float32 buffers so normalization can scale in place
+    stems = {
+        stem_name: np.require(stem_audio, dtype=np.float32, requirements=['C', 'W'])
+        for stem_name, stem_audio in prediction.items()
+    }
+
+    # One analysis pass over every stem (peak, RMS, loudness), then the gains
+    meters = dict(zip(stems, run_parallel(
+        [lambda stem_audio=stem_audio: measure_stem(stem_audio, sample_rate)
+         for stem_audio in stems.values()],
+        write_workers
+    )))
+    gains = normalization_gains({name: meter.peak for name, meter in meters.items()},
+                                normalize, headroom)
+
+    # Normalize and save every stem concurrently
+    def write(stem_name, stem_audio, paths, clean_name):
+        write_stem(stem_name, stem_audio, paths, sample_rate, gains[stem_name])
+        progress.advance('write', len(stems), stem=clean_name)
+
+    tasks = []
+    stem_variants = {}
+    levels = {}
+    for stem_name, stem_audio in stems.items():
+        clean_name = clean_stem_name(stem_name)
+        paths = stem_output_paths(output_dir, process_id, clean_name, formats)
+        stem_variants[clean_name] = paths
+        levels[clean_name] = meters[stem_name].report(gains[stem_name])
+        tasks.append(lambda args=(stem_name, stem_audio, paths, clean_name): write(*args))
+
+    run_parallel(tasks, write_workers)
+    progress.end('write')
+
+    return stem_variants, sample_rate, float(len(waveform) / sample_rate), levels
+
+
+def iter_windows(source, window, overlap):
+    """
+    Yield ``(block, is_last)`` windows of ``window`` frames from an open
+    SoundFile or FFmpegAudioStream.
+
+    Consecutive windows share ``overlap`` frames, so only ``window - overlap``
+    new frames are read per step. The next step is read before a window is
+    yielded, so the end is found without trusting the source's frame count.
+    """
+    block = source.read(window, dtype='float32', always_2d=True)
+    while len(block):
+        fresh = source.read(window - overlap, dtype='float32', always_2d=True)
+        is_last = not len(fresh)
+        yield block, is_last
+        if is_last:
+            break
+        block = np.concatenate([block[-overlap:], fresh]) if overlap else fresh
+
+
+def separate_streaming(separator, audio_file, output_dir, process_id,
+                       chunk_seconds=30.0, overlap_seconds=2.0,
+                       formats=('wav',), write_workers=1,
+                       normalize='stem', headroom=0.95, progress=None):
+    """
+    Separate a file window by window with bounded memory.
+
+    Each window is separated on its own and the overlapping region between
+    neighbouring windows is linearly crossfaded. Stems are appended to
+    float WAVs as they are produced and normalized in a second blockwise
+    pass, so peak memory depends on the window size, not the track length.
+    """
+    progress = progress or ProgressReporter(process_id, enabled=False)
+    partial_files = {}
+    writers = {}
+    meters = {}
+    tails = {}
+
+    # Windows are decoded as they are separated, so decode only covers opening the file
+    progress.start('decode')
+    with open_audio_stream(audio_file) as source:
+        sample_rate = source.samplerate
+        # Exact for libsndfile, estimated from the probe for ffmpeg-decoded files
+        total_frames = source.frames
+        window = max(1, int(chunk_seconds * sample_rate))
+        overlap = min(int(overlap_seconds * sample_rate), window // 2)
+        window_count = 1 + -(-max(total_frames - window, 0) // (window - overlap))
+        progress.end('decode', frames=total_frames, sample_rate=int(sample_rate))
+        fade_in = np.linspace(0.0, 1.0, overlap, dtype=np.float32)[:, None]
+        fade_out = 1.0 - fade_in
+
+        print(f"Streaming separation: {total_frames} frames at {sample_rate} Hz, "
+              f"{chunk_seconds}s windows with {overlap / sample_rate:.2f}s overlap")
+
+        progress.start('separate', total=window_count)
+        try:
+            for chunk_index, (block, is_last) in enumerate(iter_windows(source, window, overlap)):
+                print(f"Separating window {chunk_index + 1}...")
+                prediction = separator.separate(to_stereo(block))
+
+                for stem_name, stem_audio in prediction.items():
+                    stem_audio = np.asarray(stem_audio[:len(block)], dtype=np.float32)
+
+                    if stem_name not in writers:
+                        clean_name = clean_stem_name(stem_name)
+                        partial_path = os.path.join(output_dir, f"{process_id}_{clean_name}.partial.wav")
+                        writers[stem_name] = sf.SoundFile(
+                            partial_path, 'w', samplerate=sample_rate,
+                            channels=stem_audio.shape[1], subtype='FLOAT'
+                        )
+                        partial_files[stem_name] = (clean_name, partial_path)
+                        meters[stem_name] = LevelMeter(sample_rate, stem_audio.shape[1])
+
+                    # Crossfade the seam with the held-back tail of the previous window
+                    tail = tails.get(stem_name)
+                    if tail is not None:
+                        seam = len(tail)
+                        stem_audio[:seam] = tail * fade_out[:seam] + stem_audio[:seam] * fade_in[:seam]
+
+                    if is_last or not overlap:
+                        ready = stem_audio
+                    else:
+                        ready = stem_audio[:-overlap]
+                        tails[stem_name] = stem_audio[-overlap:].copy()
+
+                    if len(ready):
+                        writers[stem_name].write(ready)
+                        meters[stem_name].add(ready)
+
+                progress.step('separate', chunk_index + 1, window_count,
+                              seconds=round(len(block) / sample_rate, 3))
+        finally:
+            for writer in writers.values():
+                writer.close()
+        total_frames = source.tell()
+        progress.end('separate')
+
+    # Second pass: normalize each stem blockwise into its final outputs
+    progress.start('write', total=len(partial_files))
+    gains = normalization_gains({name: meter.peak for name, meter in meters.items()},
+                                normalize, headroom)
+
+    def finalize(stem_name, partial_path, paths, gain, clean_name):
+        finalize_partial_stem(stem_name, partial_path, paths, gain, window)
+        progress.advance('write', len(partial_files), stem=clean_name)
+
+    tasks = []
+    stem_variants = {}
+    levels = {}
+    for stem_name, (clean_name, partial_path) in partial_files.items():
+        paths = stem_output_paths(output_dir, process_id, clean_name, formats)
+        stem_variants[clean_name] = paths
+        gain = gains[stem_name]
+        levels[clean_name] = meters[stem_name].report(gain)
+        tasks.append(lambda args=(stem_name, partial_path, paths, gain, clean_name): finalize(*args))
+
+    run_parallel(tasks, write_workers)
+    progress.end('write')
+
+    return stem_variants, sample_rate, float(total_frames / sample_rate), levels
+
+
+def finalize_partial_stem(stem_name, partial_path, paths, gain, block_frames):
+    """Rescale a float partial stem blockwise into every requested output format"""
+    print(f"Saving {stem_name} to {', '.join(paths.values())}")
+
+    # Written under temporary names and replaced, as the old outputs may be
+    # linked from the stem cache
+    staging = {fmt: temp_path(path) for fmt, path in paths.items()}
+
+    with sf.SoundFile(partial_path) as partial:
+        outputs = [
+            sf.SoundFile(staging[fmt], 'w', samplerate=partial.samplerate,
+                         channels=partial.channels, **OUTPUT_FORMATS[fmt])
+            for fmt in paths
+        ]
+        try:
+            for block in partial.blocks(blocksize=block_frames, dtype='float32', always_2d=True):
+                if gain != 1.0:
+                    block *= gain
+                for out in outputs:
+                    out.write(block)
+        finally:
+            for out in outputs:
+                out.close()
+
+    for fmt, path in paths.items():
+        os.replace(staging[fmt], path)
+    os.remove(partial_path)
+    print(f"✓ {stem_name} saved successfully")
+
+
+def cache_settings(options):
+    """Output settings that change the produced stems and so belong in the cache key"""
+    settings = {
+        'formats': [OUTPUT_FORMATS[fmt] for fmt in parse_formats(options.formats)],
+        'stream': bool(options.stream),
+        'normalize': options.normalize,
+        'headroom': float(options.headroom)
+    }
+    if options.stream:
+        settings['chunk_seconds'] = float(options.chunk_seconds)
+        settings['overlap_seconds'] = float(options.overlap_seconds)
+    return settings
+
+
+def flatten_variants(stem_variants):
+    """``{stem: {fmt: path}}`` -> ``{"stem.fmt": path}`` for the stem cache"""
+    return {
+        f"{name}.{fmt}": path
+        for name, paths in stem_variants.items()
+        for fmt, path in paths.items()
+    }
+
+
+def unflatten_variants(files):
+    stem_variants = {}
+    for label, path in files.items():
+        name, fmt = label.rsplit('.', 1)
+        stem_variants.setdefault(name, {})[fmt] = path
+    return stem_variants
+
+
+def open_cache(options):
+    """Return the StemCache configured by ``options``, or None when caching is off"""
+    if options.no_cache:
+        return None
+    return StemCache(options.cache_dir, int(options.cache_max_mb * 1024 * 1024))
+
+
+def separate_file(separators, audio_file, output_dir, process_id, options=None, decoded=None,
+                  progress=None, cache_key=None):
+    """
+    Separate a single audio file into stems and write its metadata JSON.
+
+    ``cache_key`` may be passed in when it was already computed (e.g. by the
+    batch prefetch), so the file isn't hashed twice.
+    """
+    options = options or DEFAULT_OPTIONS
+    progress = progress or ProgressReporter(process_id, enabled=False)
+    print(f"Starting Spleeter processing for file: {audio_file}")
+    print(f"Process ID: {process_id}")
+    print(f"Output directory: {output_dir}")
+
+    # Create output directory
+    os.makedirs(output_dir, exist_ok=True)
+
+    model = parse_model(options.model)
+    cache = open_cache(options)
+    cached = None
+    if cache is not None:
+        cache_key = cache_key or cache.key_for(audio_file, model, cache_settings(options))
+        cached = cache.lookup(cache_key)
+
+    formats = parse_formats(options.formats)
+
+    if cached is not None:
+        print(f"Cache hit for {audio_file} ({cache_key[:12]}), skipping separation")
+        stem_variants = unflatten_variants(cache.restore(cache_key, cached, output_dir, process_id))
+        sample_rate = cached['sample_rate']
+        duration = cached['duration']
+        levels = cached.get('levels', {})
+    elif options.stream:
+        stem_variants, sample_rate, duration, levels = separate_streaming(
+            separators.get(model), audio_file, output_dir, process_id,
+            chunk_seconds=options.chunk_seconds,
+            overlap_seconds=options.overlap_seconds,
+            formats=formats,
+            write_workers=options.write_workers,
+            normalize=options.normalize,
+            headroom=options.headroom,
+            progress=progress
+        )
+    else:
+        stem_variants, sample_rate, duration, levels = separate_in_memory(
+            separators.get(model), audio_file, output_dir, process_id,
+            formats=formats,
+            write_workers=options.write_workers,
+            decoded=decoded,
+            normalize=options.normalize,
+            headroom=options.headroom,
+            progress=progress
+        )
+
+    if cache is not None and cached is None:
+        try:
+            cache.store(cache_key, flatten_variants(stem_variants), {
+                'sample_rate': int(sample_rate),
+                'duration': duration,
+                'model': model,
+                'levels': levels
+            }, process_id)
+        except OSError as e:
+            print(f"Warning: failed to cache stems: {e}")
+
+    # The primary format keeps the ``stems`` mapping the frontend already reads
+    stem_files = {name: paths[formats[0]] for name, paths in stem_variants.items()}
+
+    # Create metadata file
+    metadata = {
+        'process_id': process_id,
+        'original_file': audio_file,
+        'sample_rate': int(sample_rate),
+        'duration': duration,
+        'stems': stem_files,
+        'stem_variants': stem_variants,
+        'formats': list(formats),
+        'quality': output_quality(formats[0]),
+        'normalization': options.normalize,
+        'levels': levels,
+        'model': model,
+        'stem_names': list(stem_files),
+        'mode': 'streaming' if options.stream else 'full',
+        'cache_hit': cached is not None,
+        'timings': progress.timings(),
+        'status': 'completed'
+    }
+
+    metadata_path = os.path.join(output_dir, f"{process_id}_metadata.json")
+    with open(metadata_path, 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+    print("\n🎵 Spleeter processing completed successfully!")
+    print(f"📁 Output directory: {output_dir}")
+    print(f"📊 Metadata saved: {metadata_path}")
+    print(f"🎼 Stems created: {list(stem_files.keys())}")
+
+    return metadata
+
+
+def report_failure(output_dir, process_id, exc):
+    """Print the error, write the error metadata JSON and emit the failure marker"""
+    error_msg = f"Error during Spleeter processing: {str(exc)}"
+    print(error_msg)
+    print(f"Traceback: {traceback.format_exc()}")
+
+    # Create error metadata
+    error_metadata = {
+        'process_id': process_id,
+        'status': 'failed',
+        'error': error_msg,
+        'traceback': traceback.format_exc()
+    }
+
     try:
-        print(f"Starting Spleeter processing for file: {audio_file}")
-        print(f"Process ID: {process_id}")
-        print(f"Output directory: {output_dir}")
-        
-        # Create output directory
         os.makedirs(output_dir, exist_ok=True)
-        
-        # Initialize Spleeter with 5stems model for high-quality separation
-        print("Initializing Spleeter with 5stems-16kHz model...")
-        separator = Separator('spleeter:5stems-16kHz')
-        
-        # Load and preprocess audio for optimal quality
-        print("Loading audio file...")
-        audio, sample_rate = librosa.load(audio_file, sr=None, mono=False)
-        
-        # Ensure stereo format for better separation
-        if audio.ndim == 1:
-            audio = np.stack([audio, audio])
-        elif audio.ndim == 2 and audio.shape[0] > 2:
-            audio = audio[:2]  # Take first 2 channels
-        
-        print(f"Audio loaded: {audio.shape}, Sample rate: {sample_rate}")
-        
-        # Perform separation
-        print("Starting stem separation...")
-        waveform = audio.T  # Transpose for spleeter format
-        prediction = separator.separate(waveform)
-        
-        # Save each stem with high quality
-        stem_files = {}
-        quality_params = {
-            'samplerate': sample_rate,
-            'subtype': 'PCM_24'  # 24-bit for high quality
-        }
-        
-        for stem_name, stem_audio in prediction.items():
-            # Clean stem name for filename
-            clean_name = stem_name.replace('/', '_').replace('\\', '_')
-            output_filename = f"{process_id}_{clean_name}.wav"
-            output_path = os.path.join(output_dir, output_filename)
-            
-            print(f"Saving {stem_name} to {output_path}")
-            
-            # Normalize audio to prevent clipping while maintaining quality
-            normalized_audio = stem_audio / np.max(np.abs(stem_audio)) * 0.95
-            
-            # Save with high quality settings
-            sf.write(output_path, normalized_audio, **quality_params)
-            
-            stem_files[clean_name] = output_path
-            print(f"✓ {stem_name} saved successfully")
-        
-        # Create metadata file
-        metadata = {
-            'process_id': process_id,
-            'original_file': audio_file,
-            'sample_rate': int(sample_rate),
-            'duration': float(len(audio[0]) / sample_rate),
-            'stems': stem_files,
-            'quality': '24-bit/high',
-            'model': '5stems-16kHz',
-            'status': 'completed'
-        }
-        
-        metadata_path = os.path.join(output_dir, f"{process_id}_metadata.json")
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f, indent=2)
-        
-        print("\n🎵 Spleeter processing completed successfully!")
-        print(f"📁 Output directory: {output_dir}")
-        print(f"📊 Metadata saved: {metadata_path}")
-        print(f"🎼 Stems created: {list(stem_files.keys())}")
-        
+        error_path = os.path.join(output_dir, f"{process_id}_error.json")
+        with open(error_path, 'w') as f:
+            json.dump(error_metadata, f, indent=2)
+    except:
+        pass
+
+    print(f"SPLEETER_ERROR:{process_id}")
+
+
+def process_job(separators, audio_file, output_dir, process_id, options=None, decoded=None,
+                cache_key=None):
+    """
+    Run one separation job and emit the SPLEETER_SUCCESS/SPLEETER_ERROR marker.
+
+    SPLEETER_PROGRESS events are printed along the way, ending with a
+    ``done`` event just before the marker.
+    """
+    progress = ProgressReporter(process_id)
+    try:
+        if not os.path.exists(audio_file):
+            raise FileNotFoundError(f"Audio file '{audio_file}' not found.")
+
+        separate_file(separators, audio_file, output_dir, process_id, options, decoded, progress,
+                      cache_key)
+
         # Output final status for Node.js
+        progress.finish('completed')
         print(f"SPLEETER_SUCCESS:{process_id}")
-        
+        return True
+
     except Exception as e:
-        error_msg = f"Error during Spleeter processing: {str(e)}"
-        print(error_msg)
-        print(f"Traceback: {traceback.format_exc()}")
-        
-        # Create error metadata
-        error_metadata = {
-            'process_id': process_id,
-            'status': 'failed',
-            'error': error_msg,
-            'traceback': traceback.format_exc()
-        }
-        
+        progress.finish('failed', error=str(e))
+        report_failure(output_dir, process_id, e)
+        return False
+
+
+def job_options(defaults, job):
+    """Apply the per-job overrides of a worker/batch line on top of the CLI defaults"""
+    options = argparse.Namespace(**vars(defaults))
+    for key in JOB_OPTION_KEYS:
+        if key in job:
+            setattr(options, key, job[key])
+    return options
+
+
+def parse_job(line):
+    """
+    Parse one worker/batch JSON line into ``(audio_file, output_dir, process_id, job)``.
+
+    The input and output keys may be spelled ``input``/``output_dir`` (worker
+    protocol) or ``path``/``output`` (batch manifests).
+    """
+    job = json.loads(line)
+    audio_file = job['input'] if 'input' in job else job['path']
+    output_dir = job['output_dir'] if 'output_dir' in job else job['output']
+    process_id = str(job['process_id'])
+    return audio_file, output_dir, process_id, job
+
+
+def run_worker(options, stream=sys.stdin):
+    """
+    Long-running worker mode: load the separator once and take jobs from stdin.
+
+    Each input line is a JSON object with ``input``, ``output_dir`` and
+    ``process_id`` keys, plus optional overrides such as ``model`` or
+    ``stream``. Separators for every ``--preload`` model are built up front
+    and any other model is loaded on first request and then kept. Every
+    job reports SPLEETER_PROGRESS events while it runs and ends with the
+    usual SPLEETER_SUCCESS/SPLEETER_ERROR marker line so the Node side can
+    match it to its request.
+    """
+    # Markers must reach the parent as soon as they are printed
+    sys.stdout.reconfigure(line_buffering=True)
+
+    separators = SeparatorPool()
+    for model in options.preload.split(',') if options.preload else [options.model]:
+        separators.get(model)
+    print(f"SPLEETER_READY:{','.join(separators.loaded())}")
+
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+
         try:
-            error_path = os.path.join(output_dir, f"{process_id}_error.json")
-            with open(error_path, 'w') as f:
-                json.dump(error_metadata, f, indent=2)
-        except:
-            pass
-        
-        print(f"SPLEETER_ERROR:{process_id}")
+            audio_file, output_dir, process_id, job = parse_job(line)
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Error: invalid job line ({e}): {line}")
+            print("SPLEETER_ERROR:invalid")
+            continue
+
+        process_job(separators, audio_file, output_dir, process_id, job_options(options, job))
+
+
+def read_manifest(manifest_path):
+    """Read a JSONL batch manifest; malformed lines are reported and counted"""
+    jobs = []
+    invalid = 0
+    with open(manifest_path) as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                jobs.append(parse_job(line))
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Error: invalid manifest line {line_number} ({e}): {line}")
+                print("SPLEETER_ERROR:invalid")
+                invalid += 1
+    return jobs, invalid
+
+
+def prefetch_audio(audio_file, options):
+    """
+    Hash and decode the next batch item ahead of time.
+
+    Returns ``(decoded, cache_key)``. Streaming jobs decode as they go, and
+    items already in the stem cache are not decoded at all; the cache key
+    is handed on so the file is only hashed once.
+    """
+    if not os.path.exists(audio_file):
+        return None, None
+
+    cache = open_cache(options)
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.key_for(audio_file, parse_model(options.model), cache_settings(options))
+        if cache.lookup(cache_key) is not None:
+            return None, cache_key
+
+    if options.stream:
+        return None, cache_key
+    return load_audio(audio_file), cache_key
+
+
+def run_batch(options):
+    """
+    Separate every item of a JSONL manifest with a single separator.
+
+    While one item is being separated, the next one is hashed and decoded
+    on a background thread (not decoded if its stems are already cached).
+    Each item still gets its own metadata or error JSON, its own progress
+    events ending in ``done`` and its own SPLEETER_SUCCESS/SPLEETER_ERROR
+    marker. Returns the number of failed (or malformed) items.
+    """
+    jobs, failed = read_manifest(options.batch)
+    separators = SeparatorPool()
+    total = len(jobs) + failed
+
+    print(f"Batch: {len(jobs)} item(s) from {options.batch}")
+
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        def submit(index):
+            if index >= len(jobs):
+                return None
+            audio_file, _, _, job = jobs[index]
+            return prefetcher.submit(prefetch_audio, audio_file, job_options(options, job))
+
+        upcoming = submit(0)
+        for index, (audio_file, output_dir, process_id, job) in enumerate(jobs):
+            current, upcoming = upcoming, submit(index + 1)
+            print(f"\n[{index + 1}/{len(jobs)}] {audio_file}")
+
+            try:
+                decoded, cache_key = current.result()
+            except Exception as e:
+                ProgressReporter(process_id).finish('failed', error=str(e))
+                report_failure(output_dir, process_id, e)
+                failed += 1
+                continue
+
+            if not process_job(separators, audio_file, output_dir, process_id,
+                               job_options(options, job), decoded, cache_key):
+                failed += 1
+
+            # Release the finished waveform before the next one is held;
+            # the finished future still references it too
+            current = decoded = None
+
+    print(f"\nBatch finished: {total - failed} succeeded, {failed} failed")
+    return failed
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Separate audio into stems with Spleeter",
+        usage=USAGE
+    )
+    parser.add_argument('audio_file', nargs='?')
+    parser.add_argument('output_dir', nargs='?')
+    parser.add_argument('process_id', nargs='?')
+    parser.add_argument('--worker', action='store_true',
+                        help="Keep the model loaded and read JSON jobs from stdin")
+    parser.add_argument('--model', default=DEFAULT_MODEL,
+                        help=f"Spleeter model: {', '.join(MODELS)} (default: {DEFAULT_MODEL})")
+    parser.add_argument('--preload', metavar='MODELS',
+                        help="Comma-separated models the worker loads at startup (default: --model)")
+    parser.add_argument('--batch', metavar='MANIFEST',
+                        help="Separate every {path, output, process_id} line of a JSONL manifest")
+    parser.add_argument('--stream', action='store_true',
+                        help="Separate in overlapping windows with bounded memory")
+    parser.add_argument('--chunk-seconds', type=float, default=30.0,
+                        help="Window length for --stream (default: 30)")
+    parser.add_argument('--overlap-seconds', type=float, default=2.0,
+                        help="Crossfaded overlap between windows for --stream (default: 2)")
+    parser.add_argument('--formats', default='wav',
+                        help="Comma-separated stem encodings: wav, flac, ogg (default: wav)")
+    parser.add_argument('--write-workers', type=int, default=min(5, os.cpu_count() or 1),
+                        help="Threads used to normalize and write stems")
+    parser.add_argument('--normalize', choices=NORMALIZE_MODES, default='stem',
+                        help="Per-stem peak gain, one common gain that keeps stems summing "
+                             "to the mix, or none (default: stem)")
+    parser.add_argument('--headroom', type=float, default=0.95,
+                        help="Peak level normalized stems are scaled to (default: 0.95)")
+    parser.add_argument('--cache-dir', default=os.path.join('uploads', 'stems', '.cache'),
+                        help="Directory of the content-addressed stem cache")
+    parser.add_argument('--cache-max-mb', type=float, default=2048,
+                        help="Size bound of the stem cache before LRU eviction (default: 2048)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Always separate, never read or write the stem cache")
+    return parser
+
+
+# Worker/batch job keys that may override the command line defaults
+JOB_OPTION_KEYS = ('model', 'stream', 'chunk_seconds', 'overlap_seconds', 'formats', 'write_workers', 'normalize', 'no_cache')
+
+DEFAULT_OPTIONS = build_parser().parse_args([])
+
+
+def main():
+    options = build_parser().parse_args()
+
+    if options.worker:
+        run_worker(options)
+        return
+
+    if options.batch:
+        if run_batch(options):
+            sys.exit(1)
+        return
+
+    if not (options.audio_file and options.output_dir and options.process_id):
+        print(USAGE)
+        sys.exit(1)
+
+    audio_file = options.audio_file
+    output_dir = options.output_dir
+    process_id = options.process_id
+
+    if not os.path.exists(audio_file):
+        print(f"Error: Audio file '{audio_file}' not found.")
+        sys.exit(1)
+
+    # The separator is only built if the stem cache misses
+    if not process_job(SeparatorPool(), audio_file, output_dir, process_id, options):
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
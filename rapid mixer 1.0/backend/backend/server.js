@@ -5,6 +5,7 @@ const path = require('path');
 const fs = require('fs');
 const { spawn } = require('child_process');
 const config = require('./config/config');
+const spleeterWorker = require('./services/spleeterWorker');
 
 // Import route files
 const audioRoutes = require('./routes/api/audio');
@@ -87,7 +88,7 @@ app.get('/health', (req, res) => {
 // Audio upload from URL endpoint (for web)
 app.post('/api/audio/upload-url', express.json(), async (req, res) => {
     try {
-        const { audioUrl } = req.body;
+        const { audioUrl, model } = req.body;
         
         if (!audioUrl) {
             return res.status(400).json({ error: 'No audio URL provided' });
@@ -102,7 +103,7 @@ app.post('/api/audio/upload-url', express.json(), async (req, res) => {
         }
         
         const audioBuffer = await response.arrayBuffer();
-        const processId = Date.now().toString();
+        const processId = spleeterWorker.newProcessId();
         const fileName = `url_audio_${processId}.wav`;
         const inputPath = `uploads/${fileName}`;
         
@@ -123,11 +124,12 @@ app.post('/api/audio/upload-url', express.json(), async (req, res) => {
             success: true,
             message: 'Audio URL processed, processing started',
             processId: processId,
-            inputPath: inputPath
+            inputPath: inputPath,
+            model: model || '5stems-16kHz'
         });
 
         // Start Spleeter processing in background
-        processSpleeter(inputPath, outputDir, processId);
+        processSpleeter(inputPath, outputDir, processId, model ? { model } : {}).catch(() => {});
 
     } catch (error) {
         console.error('URL processing error:', error);
@@ -138,42 +140,40 @@ app.post('/api/audio/upload-url', express.json(), async (req, res) => {
 
 
 // Spleeter processing function
-function processSpleeter(inputPath, outputDir, processId) {
-    return new Promise((resolve, reject) => {
-        console.log(`Starting Spleeter processing for process ID: ${processId}`);
-        
-        // Use the enhanced Python script
-        const pythonProcess = spawn('python', ['process_audio.py', inputPath, outputDir, processId]);
-        
-        let stdout = '';
-        let stderr = '';
-        
-        pythonProcess.stdout.on('data', (data) => {
-            stdout += data.toString();
-            console.log(`Spleeter stdout: ${data}`);
-        });
-        
-        pythonProcess.stderr.on('data', (data) => {
-            stderr += data.toString();
-            console.error(`Spleeter stderr: ${data}`);
+function processSpleeter(inputPath, outputDir, processId, options = {}) {
+    console.log(`Starting Spleeter processing for process ID: ${processId}`);
+
+    // Jobs go to the persistent worker so the model is only loaded once
+    return spleeterWorker.process(inputPath, outputDir, processId, options)
+        .then((result) => {
+            console.log(`Spleeter processing completed successfully for process ID: ${processId}`);
+            return result;
+        })
+        .catch((error) => {
+            console.error(`Spleeter processing failed for process ID: ${processId}`);
+            throw error;
         });
-        
-        pythonProcess.on('close', (code) => {
-            console.log(`Spleeter process exited with code: ${code}`);
-            if (code === 0) {
-                console.log(`Spleeter processing completed successfully for process ID: ${processId}`);
-                resolve({ success: true, processId, outputDir });
-            } else {
-                console.error(`Spleeter processing failed for process ID: ${processId}`);
-                reject({ success: false, error: stderr, processId });
+}
+
+// Still being written by process_audio.py: streaming partials and atomic-replace temps
+const IN_PROGRESS_FILE = /\.partial\.|\.tmp-/;
+
+// Files a job can have written, relative to the stems directory: uploads
+// write straight into it, URL jobs into their own subdirectory. The stem
+// cache under .cache is never walked.
+function listJobFiles(stemsDir, processId) {
+    const files = [];
+    [stemsDir, path.join(stemsDir, processId)].forEach((dir) => {
+        if (!fs.existsSync(dir)) {
+            return;
+        }
+        fs.readdirSync(dir, { withFileTypes: true }).forEach((entry) => {
+            if (entry.isFile() && !IN_PROGRESS_FILE.test(entry.name)) {
+                files.push(path.relative(stemsDir, path.join(dir, entry.name)));
             }
         });
-        
-        pythonProcess.on('error', (error) => {
-            console.error(`Spleeter process error: ${error}`);
-            reject({ success: false, error: error.message, processId });
-        });
     });
+    return files;
 }
 
 // Get processing status
@@ -192,11 +192,55 @@ app.get('/api/audio/status/:processId', (req, res) => {
     
     try {
         // Look for stem files
-        const files = fs.readdirSync(outputDir, { recursive: true });
+        const files = listJobFiles(outputDir, path.basename(processId));
+
+        // The metadata/error JSON written by process_audio.py is authoritative:
+        // it lists exactly the stems the selected model produced.
+        const metadataFile = files.find(file => path.basename(file) === `${processId}_metadata.json`);
+        if (metadataFile) {
+            const metadata = JSON.parse(fs.readFileSync(path.join(outputDir, metadataFile), 'utf8'));
+            const stems = {};
+            Object.entries(metadata.stems || {}).forEach(([stemName, stemPath]) => {
+                stems[stemName] = `/stems/${path.relative(outputDir, stemPath).split(path.sep).join('/')}`;
+            });
+            return res.json({
+                processId,
+                status: 'completed',
+                progress: 100,
+                model: metadata.model,
+                timings: metadata.timings,
+                stems
+            });
+        }
+
+        const errorFile = files.find(file => path.basename(file) === `${processId}_error.json`);
+        if (errorFile) {
+            const errorMetadata = JSON.parse(fs.readFileSync(path.join(outputDir, errorFile), 'utf8'));
+            return res.json({
+                processId,
+                status: 'failed',
+                progress: 100,
+                error: errorMetadata.error,
+                stems: stemFiles
+            });
+        }
+
+        // Still running: report the live progress events from the worker
+        const live = spleeterWorker.getProgress(processId);
+        if (live) {
+            return res.json({
+                processId,
+                status: 'processing',
+                progress: Math.round(live.progress * 100),
+                phase: live.phase,
+                phaseProgress: live.phaseTotal ? { done: live.phaseDone || 0, total: live.phaseTotal } : null,
+                timings: live.phases,
+                stems: stemFiles
+            });
+        }
         
         files.forEach(file => {
-            const filePath = path.join(outputDir, file);
-            if (fs.statSync(filePath).isFile() && file.includes(processId)) {
+            if (file.includes(processId)) {
                 if (file.includes('vocals')) stemFiles.vocals = `/stems/${file}`;
                 else if (file.includes('drums')) stemFiles.drums = `/stems/${file}`;
                 else if (file.includes('bass')) stemFiles.bass = `/stems/${file}`;
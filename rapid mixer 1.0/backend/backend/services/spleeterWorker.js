@@ -0,0 +1,212 @@
+const { spawn } = require('child_process');
+const { EventEmitter } = require('events');
+const readline = require('readline');
+
+// Long-running `process_audio.py --worker` process. The separator model is
+// loaded once and jobs are fed over stdin as JSON lines; each job finishes
+// with a SPLEETER_SUCCESS:<id> or SPLEETER_ERROR:<id> line on stdout.
+const MARKER_PATTERN = /^SPLEETER_(SUCCESS|ERROR):(.+)$/;
+
+// Structured progress events (decode / separate / write phases) printed as
+// SPLEETER_PROGRESS:{json}. Not anchored: a stray log line from a writer
+// thread may share the line with the event.
+const PROGRESS_PATTERN = /SPLEETER_PROGRESS:(\{.*\})\s*$/;
+
+// A job that reports nothing for this long is treated as a hung worker:
+// the worker is killed, waiting jobs fail and the next job restarts it.
+const JOB_TIMEOUT_MS = Number(process.env.SPLEETER_JOB_TIMEOUT_MS) || 15 * 60 * 1000;
+
+// Unique per job, so two uploads in the same millisecond don't collide
+function newProcessId() {
+    return `${Date.now()}-${Math.round(Math.random() * 1E9)}`;
+}
+
+class SpleeterWorker extends EventEmitter {
+    constructor(scriptPath = 'process_audio.py', jobTimeoutMs = JOB_TIMEOUT_MS) {
+        super();
+        this.scriptPath = scriptPath;
+        this.jobTimeoutMs = jobTimeoutMs;
+        this.child = null;
+        this.pending = new Map();
+        this.progress = new Map();
+        this.watchdog = null;
+    }
+
+    start() {
+        if (this.child) {
+            return this.child;
+        }
+
+        console.log('Starting persistent Spleeter worker');
+        const child = spawn('python', [this.scriptPath, '--worker']);
+        this.child = child;
+
+        readline.createInterface({ input: child.stdout }).on('line', (line) => {
+            if (this.handleProgress(line)) {
+                return;
+            }
+            console.log(`Spleeter worker: ${line}`);
+            this.handleLine(line);
+        });
+
+        child.stderr.on('data', (data) => {
+            console.error(`Spleeter worker stderr: ${data}`);
+        });
+
+        // Writing to a worker that died before its 'close' event raises
+        // EPIPE here; without a listener it would crash the server
+        child.stdin.on('error', (error) => {
+            console.error(`Spleeter worker stdin error: ${error}`);
+            this.handleExit(child, `Spleeter worker stdin error: ${error.message}`);
+            child.kill('SIGKILL');
+        });
+
+        child.on('error', (error) => {
+            console.error(`Spleeter worker error: ${error}`);
+            this.handleExit(child, error.message);
+        });
+
+        child.on('close', (code) => {
+            console.log(`Spleeter worker exited with code: ${code}`);
+            this.handleExit(child, `Spleeter worker exited with code ${code}`);
+        });
+
+        return child;
+    }
+
+    handleLine(line) {
+        const match = MARKER_PATTERN.exec(line.trim());
+        if (!match) {
+            return;
+        }
+
+        const [, status, processId] = match;
+        const job = this.pending.get(processId);
+        if (!job) {
+            return;
+        }
+
+        this.pending.delete(processId);
+        // The worker moves on to the next queued job
+        this.resetWatchdog();
+        if (status === 'SUCCESS') {
+            job.resolve({ success: true, processId, outputDir: job.outputDir });
+        } else {
+            job.reject({ success: false, error: 'Spleeter processing failed', processId });
+        }
+    }
+
+    handleProgress(line) {
+        const match = PROGRESS_PATTERN.exec(line);
+        if (!match) {
+            return false;
+        }
+
+        let event;
+        try {
+            event = JSON.parse(match[1]);
+        } catch (error) {
+            console.error(`Spleeter worker: malformed progress event: ${line}`);
+            return true;
+        }
+
+        const processId = String(event.process_id);
+        const state = this.progress.get(processId) || {
+            processId,
+            progress: 0,
+            phase: null,
+            startedAt: event.timestamp,
+            phases: {}
+        };
+        state.progress = event.progress;
+        state.updatedAt = event.timestamp;
+        if (event.phase) {
+            state.phase = event.phase;
+            state.phaseDone = event.done;
+            state.phaseTotal = event.total;
+        }
+        if (event.event === 'end') {
+            state.phases[event.phase] = event.duration;
+        }
+
+        if (event.event === 'done') {
+            // The metadata/error JSON on disk takes over from here
+            this.progress.delete(processId);
+            console.log(`Spleeter worker: ${processId} ${event.status} in ${event.duration}s ${JSON.stringify(event.phases)}`);
+        } else {
+            this.progress.set(processId, state);
+        }
+
+        this.resetWatchdog();
+        this.emit('progress', event);
+        return true;
+    }
+
+    // Latest progress of a job still being processed, or null
+    getProgress(processId) {
+        return this.progress.get(String(processId)) || null;
+    }
+
+    // Restart the hung-job timer whenever the worker shows signs of life
+    resetWatchdog() {
+        clearTimeout(this.watchdog);
+        this.watchdog = null;
+        if (this.pending.size === 0 || !this.child) {
+            return;
+        }
+
+        const child = this.child;
+        this.watchdog = setTimeout(() => {
+            console.error(`Spleeter worker made no progress for ${this.jobTimeoutMs} ms, restarting it`);
+            this.handleExit(child, 'Spleeter job timed out');
+            child.kill('SIGKILL');
+        }, this.jobTimeoutMs);
+        this.watchdog.unref();
+    }
+
+    handleExit(child, reason) {
+        // A late 'error'/'close' from a worker that was already replaced
+        // must not fail the jobs of the current one
+        if (child !== this.child) {
+            return;
+        }
+        this.child = null;
+        clearTimeout(this.watchdog);
+        this.watchdog = null;
+
+        // Jobs still in flight will never get their marker; fail them so the
+        // next submission restarts a fresh worker.
+        this.pending.forEach((job, processId) => {
+            job.reject({ success: false, error: reason, processId });
+        });
+        this.pending.clear();
+        this.progress.clear();
+    }
+
+    // `options` are per-job overrides understood by process_audio.py,
+    // e.g. { stream: true } for bounded-memory separation of long tracks.
+    process(inputPath, outputDir, processId, options = {}) {
+        return new Promise((resolve, reject) => {
+            const id = String(processId);
+            if (this.pending.has(id)) {
+                return reject({ success: false, error: 'Process ID already queued', processId: id });
+            }
+
+            const child = this.start();
+            this.pending.set(id, { resolve, reject, outputDir });
+            if (this.pending.size === 1) {
+                this.resetWatchdog();
+            }
+            child.stdin.write(JSON.stringify({
+                ...options,
+                input: inputPath,
+                output_dir: outputDir,
+                process_id: id
+            }) + '\n');
+        });
+    }
+}
+
+module.exports = new SpleeterWorker();
+module.exports.SpleeterWorker = SpleeterWorker;
+module.exports.newProcessId = newProcessId;
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import uuid
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def temp_path(path):
+    """Sibling of ``path`` to write into before an ``os.replace`` onto it"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.tmp-{uuid.uuid4().hex[:8]}{ext}"
+
+
+def link_or_copy(source, destination):
+    """
+    Hardlink ``source`` to ``destination``, copying when linking is not possible.
+
+    The link is made under a temporary name and renamed over ``destination``,
+    so a file already at ``destination`` is replaced, never written through.
+    """
+    staging = temp_path(destination)
+    try:
+        os.link(source, staging)
+    except OSError:
+        shutil.copy2(source, staging)
+    os.replace(staging, destination)
+
+
+class StemCache:
+    """
+    Content-addressed cache of separated stems.
+
+    Entries live in ``<root>/<key>/`` where the key hashes the input file
+    bytes together with the model name and output settings. Each entry holds
+    the output files, keyed by a caller-chosen label, plus a manifest. The
+    manifest mtime records the last use, and the least recently used entries
+    are evicted once the cache grows past ``max_bytes``.
+
+    Files are copied into the cache and only ever hardlinked out of it, so
+    writers must replace outputs (``temp_path`` + ``os.replace``) rather than
+    write into them in place.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    def key_for(self, audio_file, model, settings, block_size=1024 * 1024):
+        """Hash the file bytes, model and output settings into a cache key"""
+        digest = hashlib.sha256()
+        digest.update(model.encode('utf-8'))
+        digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+        with open(audio_file, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def lookup(self, key):
+        """Return the manifest for ``key`` and mark it as recently used, or None"""
+        manifest_path = os.path.join(self._entry_dir(key), MANIFEST_NAME)
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        entry_dir = self._entry_dir(key)
+        for filename in manifest.get('files', {}).values():
+            if not os.path.exists(os.path.join(entry_dir, filename)):
+                return None
+
+        os.utime(manifest_path)
+        return manifest
+
+    def restore(self, key, manifest, output_dir, process_id):
+        """Materialize a cached entry as ``{process_id}_<file>`` files in ``output_dir``"""
+        entry_dir = self._entry_dir(key)
+        files = {}
+        for label, filename in manifest['files'].items():
+            output_path = os.path.join(output_dir, f"{process_id}_{filename}")
+            link_or_copy(os.path.join(entry_dir, filename), output_path)
+            files[label] = output_path
+        return files
+
+    def store(self, key, files, info, process_id):
+        """Add freshly written output files to the cache and evict old entries if needed"""
+        entry_dir = self._entry_dir(key)
+        if os.path.exists(os.path.join(entry_dir, MANIFEST_NAME)):
+            return
+
+        # Build the entry under a temporary name so readers never see it half written
+        staging_dir = os.path.join(self.root, f".staging-{uuid.uuid4().hex}")
+        os.makedirs(staging_dir)
+        try:
+            prefix = f"{process_id}_"
+            cached_files = {}
+            for label, path in files.items():
+                filename = os.path.basename(path)
+                if filename.startswith(prefix):
+                    filename = filename[len(prefix):]
+                # A copy, not a link: outputs are not owned by the cache
+                shutil.copy2(path, os.path.join(staging_dir, filename))
+                cached_files[label] = filename
+
+            manifest = dict(info, files=cached_files, created_at=time.time())
+            with open(os.path.join(staging_dir, MANIFEST_NAME), 'w') as f:
+                json.dump(manifest, f, indent=2)
+
+            os.rename(staging_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            if not os.path.exists(os.path.join(entry_dir, MANIFEST_NAME)):
+                raise
+
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.root):
+            entry_dir = os.path.join(self.root, name)
+            manifest_path = os.path.join(entry_dir, MANIFEST_NAME)
+            if name.startswith('.') or not os.path.isfile(manifest_path):
+                continue
+            size = 0
+            for filename in os.listdir(entry_dir):
+                try:
+                    size += os.path.getsize(os.path.join(entry_dir, filename))
+                except OSError:
+                    pass
+            entries.append((os.path.getmtime(manifest_path), size, entry_dir))
+        return entries
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in ``max_bytes``"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in entries:
+            if total <= self.max_bytes:
+                break
+            print(f"Evicting cached stems: {entry_dir}")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+        return total
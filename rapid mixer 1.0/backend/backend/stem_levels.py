@@ -0,0 +1,163 @@
+import math
+
+import numpy as np
+from scipy.signal import sosfilt
+
+# Frames fed to the K-weighting filter at once; bounds its float64 temporaries
+MEASURE_BLOCK_FRAMES = 65536
+
+NORMALIZE_MODES = ('stem', 'common', 'none')
+
+
+def k_weighting_sos(sample_rate):
+    """
+    ITU-R BS.1770 K-weighting (high shelf + RLB high pass) as second-order
+    sections, using Brecht De Man's derivation so any sample rate reproduces
+    the 48 kHz reference coefficients.
+    """
+    # Stage 1: high shelf modelling the acoustic effect of the head
+    gain_db, q, fc = 3.99984385397, 0.7071752369554193, 1681.9744509555319
+    k = math.tan(math.pi * fc / sample_rate)
+    vh = 10 ** (gain_db / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = [
+        (vh + vb * k / q + k * k) / a0,
+        2 * (k * k - vh) / a0,
+        (vh - vb * k / q + k * k) / a0,
+        1.0,
+        2 * (k * k - 1) / a0,
+        (1 - k / q + k * k) / a0,
+    ]
+
+    # Stage 2: revised low-frequency B-weighting high pass
+    q, fc = 0.5003270373253953, 38.13547087613982
+    k = math.tan(math.pi * fc / sample_rate)
+    a0 = 1 + k / q + k * k
+    highpass = [1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    return np.array([shelf, highpass])
+
+
+def to_db(value):
+    """Amplitude to dB, with None for silence so the metadata stays valid JSON"""
+    return round(20 * math.log10(value), 2) if value > 0 else None
+
+
+class LoudnessMeter:
+    """
+    Incremental BS.1770 integrated loudness.
+
+    Samples are K-weighted as they arrive (filter state carries across calls)
+    and their energy is summed into 100 ms segments. The gated 400 ms blocks
+    are assembled from four consecutive segments at the end, so memory grows
+    by one value per channel per 100 ms, whatever the chunking.
+    """
+
+    def __init__(self, sample_rate, channels):
+        self.sos = k_weighting_sos(sample_rate)
+        self.zi = np.zeros((self.sos.shape[0], 2, channels))
+        self.segment_frames = max(1, int(round(0.1 * sample_rate)))
+        self.segments = []
+        self.pending_energy = np.zeros(channels)
+        self.pending_frames = 0
+
+    def add(self, block):
+        for start in range(0, len(block), MEASURE_BLOCK_FRAMES):
+            weighted, self.zi = sosfilt(self.sos, block[start:start + MEASURE_BLOCK_FRAMES],
+                                        axis=0, zi=self.zi)
+            squared = np.square(weighted, out=weighted)
+
+            position = 0
+            while position < len(squared):
+                take = min(self.segment_frames - self.pending_frames, len(squared) - position)
+                self.pending_energy += squared[position:position + take].sum(axis=0)
+                self.pending_frames += take
+                position += take
+                if self.pending_frames == self.segment_frames:
+                    self.segments.append(self.pending_energy)
+                    self.pending_energy = np.zeros_like(self.pending_energy)
+                    self.pending_frames = 0
+
+    def integrated(self):
+        """Integrated loudness in LUFS, or None when every block is gated out"""
+        if len(self.segments) < 4:
+            return None
+
+        segments = np.array(self.segments)
+        # Each 400 ms block is four 100 ms segments (75% overlap)
+        blocks = (segments[:-3] + segments[1:-2] + segments[2:-1] + segments[3:]) \
+            / (4 * self.segment_frames)
+        power = blocks.sum(axis=1)  # channel weights are 1.0 for L/R
+
+        with np.errstate(divide='ignore'):
+            loudness = -0.691 + 10 * np.log10(power)
+
+        gated = power[loudness > -70.0]
+        if not len(gated):
+            return None
+        relative_gate = -0.691 + 10 * np.log10(gated.mean()) - 10.0
+        gated = power[(loudness > -70.0) & (loudness > relative_gate)]
+        if not len(gated):
+            return None
+        return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+class LevelMeter:
+    """Peak, RMS and loudness of one stem, fed whole or chunk by chunk"""
+
+    def __init__(self, sample_rate, channels):
+        self.peak = 0.0
+        self.sum_squares = 0.0
+        self.samples = 0
+        self.loudness = LoudnessMeter(sample_rate, channels)
+
+    def add(self, block):
+        if not block.size:
+            return
+        # max/-min and a dot product avoid the np.abs / squared temporaries
+        self.peak = max(self.peak, float(block.max()), float(-block.min()))
+        flat = block.reshape(-1)
+        self.sum_squares += float(np.dot(flat, flat))
+        self.samples += flat.size
+        self.loudness.add(block)
+
+    def report(self, gain=1.0):
+        """Levels of the stem after applying ``gain``"""
+        rms = math.sqrt(self.sum_squares / self.samples) if self.samples else 0.0
+        lufs = self.loudness.integrated()
+        return {
+            'gain': round(gain, 6),
+            'peak': round(self.peak * gain, 6),
+            'peak_dbfs': to_db(self.peak * gain),
+            'rms_dbfs': to_db(rms * gain),
+            'lufs': round(lufs + 20 * math.log10(gain), 2) if lufs is not None and gain > 0 else None,
+        }
+
+
+def measure_stem(stem_audio, sample_rate):
+    """Run a LevelMeter over a whole in-memory (samples, channels) stem"""
+    meter = LevelMeter(sample_rate, stem_audio.shape[1])
+    meter.add(stem_audio)
+    return meter
+
+
+def normalization_gains(peaks, mode='stem', headroom=0.95):
+    """
+    Gains that bring stems up to ``headroom`` without clipping.
+
+    ``stem`` scales each stem to its own peak. ``common`` applies one gain,
+    set by the loudest stem, to all of them so the stems still sum back to
+    the mix. ``none`` leaves the stems untouched. Silent stems get a gain of
+    1.0 instead of a division by zero.
+    """
+    if mode not in NORMALIZE_MODES:
+        raise ValueError(f"Unsupported normalization '{mode}', expected one of: {', '.join(NORMALIZE_MODES)}")
+
+    if mode == 'none':
+        return {name: 1.0 for name in peaks}
+    if mode == 'common':
+        loudest = max(peaks.values(), default=0.0)
+        gain = headroom / loudest if loudest > 0 else 1.0
+        return {name: gain for name in peaks}
+    return {name: headroom / peak if peak > 0 else 1.0 for name, peak in peaks.items()}
@@ -1,12 +1,18 @@
 from fastapi import APIRouter, HTTPException
 from firebase_admin import firestore, storage
-import subprocess
 import os
 import uuid
+import asyncio
 from datetime import datetime, timedelta
 from typing import List, Dict
 import json
 
+from config import settings
+from services.ffmpeg_tools import ffmpeg_tools
+from services.filter_graph import FilterGraph
+from services.merge_planner import MergePlanner, write_concat_list
+from services.process_runner import process_runner
+
 router = APIRouter()
 db = firestore.client()
 
@@ -45,22 +51,10 @@ async def merge_3d_scenes(job_id: str):
         output_dir = f"temp/{job_id}/final"
         os.makedirs(output_dir, exist_ok=True)
         
-        # Step 1: Merge video scenes
-        merged_video = await merge_video_scenes(job_id, completed_scenes, output_dir)
-        
-        # Step 2: Extract and enhance original audio
-        enhanced_audio = await process_original_audio(job_id, job_data, output_dir)
-        
-        # Step 3: Generate background music and effects
-        background_audio = await generate_background_audio(job_id, completed_scenes, output_dir)
-        
-        # Step 4: Mix all audio tracks
-        final_audio = await mix_audio_tracks(enhanced_audio, background_audio, output_dir)
+        # Step 1: Concat scenes, enhance and mix audio, mux (one ffmpeg run)
+        final_video = await render_final_video(job_id, job_data, completed_scenes, output_dir)
         
-        # Step 5: Combine video and audio
-        final_video = await combine_video_audio(merged_video, final_audio, output_dir)
-        
-        # Step 6: Upload to Google Cloud Storage
+        # Step 2: Upload to Google Cloud Storage
         download_url = await upload_to_gcs(job_id, final_video)
         
         # Update job with final results
@@ -91,170 +85,130 @@ async def merge_3d_scenes(job_id: str):
         })
         raise HTTPException(status_code=500, detail=f"Merge failed: {str(e)}")
 
-async def merge_video_scenes(job_id: str, scenes: List[Dict], output_dir: str) -> str:
+async def render_final_video(job_id: str, job_data: Dict, scenes: List[Dict], output_dir: str) -> str:
     """
-    Merge all 3D video scenes into one continuous video
+    Render the final video with audio sync in a single ffmpeg invocation
+    
+    One filter graph concatenates the 3D scenes, cleans up the original
+    audio (highpass/lowpass/volume), generates the background tone, mixes
+    both and muxes the result, so no intermediate video or WAV files are
+    written. The scenes are read through the concat demuxer, so one
+    scene is decoded at a time; when they share their codec parameters
+    they are stream-copied instead of being decoded.
     """
+    concat_list = f"{output_dir}/concat_list.txt"
+    
     try:
-        # Create file list for ffmpeg concat
-        concat_file = f"{output_dir}/concat_list.txt"
-        
-        with open(concat_file, 'w') as f:
-            for scene in sorted(scenes, key=lambda x: x.get("start_time", 0)):
-                output_file = scene.get("output_file")
-                if output_file and os.path.exists(output_file):
-                    f.write(f"file '{os.path.abspath(output_file)}'\n")
-        
-        # Output merged video
-        merged_video = f"{output_dir}/merged_3d_video.mp4"
-        
-        # FFmpeg command to concatenate videos
-        cmd = [
-            'ffmpeg',
-            '-f', 'concat',
-            '-safe', '0',
-            '-i', concat_file,
-            '-c:v', 'libx264',
-            '-preset', 'medium',
-            '-crf', '23',
-            '-y',
-            merged_video
+        scene_files = [
+            scene.get("output_file")
+            for scene in sorted(scenes, key=lambda x: x.get("start_time", 0))
+            if scene.get("output_file") and os.path.exists(scene.get("output_file"))
         ]
+        if not scene_files:
+            raise Exception("No scene output files found")
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            raise Exception(f"Video merge failed: {result.stderr}")
-        
-        return merged_video
-        
-    except Exception as e:
-        raise Exception(f"Video merging failed: {str(e)}")
-
-async def process_original_audio(job_id: str, job_data: Dict, output_dir: str) -> str:
-    """
-    Extract and enhance original audio from the uploaded video
-    """
-    try:
-        original_video = job_data.get("temp_file_path")
-        enhanced_audio = f"{output_dir}/enhanced_audio.wav"
-        
-        # Extract audio with noise reduction and enhancement
-        cmd = [
-            'ffmpeg',
-            '-i', original_video,
-            '-vn',  # No video
-            '-acodec', 'pcm_s16le',
-            '-ar', '44100',
-            '-ac', '2',
-            '-af', 'highpass=f=80,lowpass=f=8000,volume=1.2',  # Audio filters
-            '-y',
-            enhanced_audio
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            raise Exception(f"Audio extraction failed: {result.stderr}")
+        final_video = f"{output_dir}/final_3d_video.mp4"
+        graph = FilterGraph()
+        
+        # Video: the concat demuxer feeds the scenes one after another
+        plan = await MergePlanner(ffmpeg_tools.ffmpeg_path).plan_merge(scene_files)
+        write_concat_list(scene_files, concat_list)
+        scenes_input = graph.add_input(concat_list, '-f', 'concat', '-safe', '0')
+        
+        if plan["mode"] == "copy" and settings.MERGE_STREAM_COPY:
+            video = f"{scenes_input}:v:0"
+            video_args = ['-c:v', 'copy']
+        else:
+            reference = plan["reference"]
+            # One chain brings every scene to the same size and rate
+            video = graph.chain([f"{scenes_input}:v:0"], [
+                f"scale={reference['width']}:{reference['height']}",
+                'setsar=1',
+                f"fps={reference['frame_rate']}",
+                'format=yuv420p'
+            ])
+            await ffmpeg_tools.load_capabilities()
+            video_args = ffmpeg_tools.h264_args('medium', 23)
+        
+        # Original audio with noise reduction and enhancement
+        original = graph.add_input(job_data.get("temp_file_path"))
+        voice = graph.chain([f"{original}:a:0"], [
+            'highpass=f=80',
+            'lowpass=f=8000',
+            'volume=1.2',
+            'aresample=44100',
+            'aformat=channel_layouts=stereo'
+        ])
+        
+        # Background music and effects based on scene analysis
+        background = graph.add_lavfi(background_audio_source(scenes))
+        music = graph.chain([f"{background}:a:0"], ['volume=0.1'])
         
-        return enhanced_audio
+        # Mix audio tracks with proper levels
+        mix = graph.chain([voice, music], ['amix=inputs=2:duration=first:dropout_transition=2'])
         
-    except Exception as e:
-        raise Exception(f"Audio processing failed: {str(e)}")
-
-async def generate_background_audio(job_id: str, scenes: List[Dict], output_dir: str) -> str:
-    """
-    Generate background music and sound effects based on scene analysis
-    """
-    try:
-        # Analyze scenes to determine appropriate background music
-        scene_types = [s.get("scene_analysis", {}).get("scene_type", "general") for s in scenes]
-        dominant_type = max(set(scene_types), key=scene_types.count)
+        cmd = graph.command(ffmpeg_tools.ffmpeg_path, [video, mix], [
+            *video_args,
+            '-c:a', 'aac',
+            '-b:a', '192k',
+            '-shortest'
+        ], final_video)
         
-        # Generate background audio based on scene type
-        background_audio = f"{output_dir}/background_audio.wav"
+        # Live render progress moves the job from 75% towards 95%
+        job_ref = db.collection("jobs").document(job_id)
+        reported = {"progress": 75.0, "pending": None}
+        
+        def on_progress(snapshot: Dict):
+            # Firestore writes run in a thread so the progress pipe keeps
+            # draining; one at a time, so progress never goes backwards
+            pending = reported["pending"]
+            if pending and not pending.done():
+                return
+            progress = round(75.0 + 20.0 * snapshot.get("percent", 0.0), 1)
+            if progress - reported["progress"] >= 1.0:
+                reported["progress"] = progress
+                reported["pending"] = asyncio.ensure_future(asyncio.to_thread(job_ref.update, {
+                    "progress": progress,
+                    "render_speed": snapshot.get("speed"),
+                    "render_fps": snapshot.get("fps"),
+                    "updated_at": datetime.utcnow()
+                }))
         
-        # For now, create a simple ambient background
-        # In production, this would call AI music generation APIs
         duration = sum([s.get("duration", 8.0) for s in scenes])
+        result = await process_runner.run_ffmpeg(cmd, 'final_render', duration, on_progress)
         
-        # Generate simple ambient tone (replace with AI-generated music)
-        cmd = [
-            'ffmpeg',
-            '-f', 'lavfi',
-            '-i', f'sine=frequency=220:duration={duration}',
-            '-af', 'volume=0.1',
-            '-y',
-            background_audio
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            raise Exception(f"Background audio generation failed: {result.stderr}")
-        
-        return background_audio
-        
-    except Exception as e:
-        raise Exception(f"Background audio generation failed: {str(e)}")
-
-async def mix_audio_tracks(enhanced_audio: str, background_audio: str, output_dir: str) -> str:
-    """
-    Mix original enhanced audio with background music
-    """
-    try:
-        mixed_audio = f"{output_dir}/final_audio.wav"
-        
-        # Mix audio tracks with proper levels
-        cmd = [
-            'ffmpeg',
-            '-i', enhanced_audio,
-            '-i', background_audio,
-            '-filter_complex', '[0:a][1:a]amix=inputs=2:duration=first:dropout_transition=2[out]',
-            '-map', '[out]',
-            '-y',
-            mixed_audio
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        if reported["pending"]:
+            try:
+                await reported["pending"]
+            except Exception as e:
+                print(f"Warning: render progress update failed: {e}")
         
         if result.returncode != 0:
-            raise Exception(f"Audio mixing failed: {result.stderr}")
+            raise Exception(f"Final render failed: {result.stderr}")
         
-        return mixed_audio
+        return final_video
         
     except Exception as e:
-        raise Exception(f"Audio mixing failed: {str(e)}")
+        raise Exception(f"Final render failed: {str(e)}")
+    
+    finally:
+        if os.path.exists(concat_list):
+            os.remove(concat_list)
 
-async def combine_video_audio(video_file: str, audio_file: str, output_dir: str) -> str:
+def background_audio_source(scenes: List[Dict]) -> str:
     """
-    Combine final video with mixed audio
+    lavfi source for the background music of the scenes
     """
-    try:
-        final_video = f"{output_dir}/final_3d_video.mp4"
-        
-        # Combine video and audio
-        cmd = [
-            'ffmpeg',
-            '-i', video_file,
-            '-i', audio_file,
-            '-c:v', 'copy',
-            '-c:a', 'aac',
-            '-b:a', '192k',
-            '-shortest',
-            '-y',
-            final_video
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            raise Exception(f"Video-audio combination failed: {result.stderr}")
-        
-        return final_video
-        
-    except Exception as e:
-        raise Exception(f"Video-audio combination failed: {str(e)}")
+    # Analyze scenes to determine appropriate background music
+    scene_types = [s.get("scene_analysis", {}).get("scene_type", "general") for s in scenes]
+    dominant_type = max(set(scene_types), key=scene_types.count)
+    
+    # For now, create a simple ambient background
+    # In production, this would call AI music generation APIs
+    duration = sum([s.get("duration", 8.0) for s in scenes])
+    
+    # Simple ambient tone (replace with AI-generated music)
+    return f'sine=frequency=220:duration={duration}'
 
 async def upload_to_gcs(job_id: str, video_file: str) -> str:
     """
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, HTTPException
 from firebase_admin import firestore
-import subprocess
 import os
-import json
 from datetime import datetime
 from typing import List, Dict
 
+from config import settings
+from services.ffmpeg_tools import ffmpeg_tools
+from services.shot_detector import ShotDetector, scene_boundaries
+from services.split_planner import SplitPlanner
+
 router = APIRouter()
 db = firestore.client()
 
@@ -36,14 +39,13 @@ async def split_video_scenes(job_id: str):
         })
         
         input_file = job_data.get("temp_file_path")
-        duration = job_data.get("duration", 30.0)
         
         # Create output directory for scenes
         scenes_dir = f"temp/{job_id}/scenes"
         os.makedirs(scenes_dir, exist_ok=True)
         
         # Split video into 8-second chunks
-        scenes = await split_video_into_chunks(input_file, scenes_dir, duration)
+        scenes = await split_video_into_chunks(input_file, scenes_dir)
         
         # Update job with scene information
         job_ref.update({
@@ -70,82 +72,61 @@ async def split_video_scenes(job_id: str):
         })
         raise HTTPException(status_code=500, detail=f"Scene splitting failed: {str(e)}")
 
-async def split_video_into_chunks(input_file: str, output_dir: str, duration: float) -> List[Dict]:
+async def split_video_into_chunks(input_file: str, output_dir: str) -> List[Dict]:
     """
-    Split video into 8-second chunks using ffmpeg
+    Split video into chunks of at most 8 seconds using ffmpeg
+
+    Chunks end at detected shot changes where one falls between
+    SCENE_MIN_DURATION and 8 seconds into the chunk. Boundaries then snap
+    to source keyframes within a small tolerance (one frame for shot
+    changes), so chunks that start and end on keyframes are stream-copied;
+    only the others are re-encoded, several at once.
     """
-    chunk_duration = 8.0  # 8 seconds per chunk
+    chunk_duration = 8.0  # at most 8 seconds per chunk
     scenes = []
     
     try:
-        # Calculate number of chunks
-        num_chunks = int(duration / chunk_duration) + (1 if duration % chunk_duration > 0 else 0)
-        
-        for i in range(num_chunks):
-            start_time = i * chunk_duration
-            output_file = f"{output_dir}/scene_{i:03d}.mp4"
+        boundaries = None
+        tolerance = settings.SCENE_KEYFRAME_TOLERANCE
+        if settings.SCENE_DETECTION:
+            detector = ShotDetector(ffmpeg_tools.ffmpeg_path, settings.SHOT_CUT_THRESHOLD)
+            shots = await detector.detect(input_file)
+            boundaries = scene_boundaries(
+                shots['shot_changes'], shots['duration'],
+                settings.SCENE_MIN_DURATION, chunk_duration
+            )
+            tolerance = min(tolerance, 1.0 / shots['fps'])
+        
+        planner = SplitPlanner(ffmpeg_tools.ffmpeg_path, ffmpeg_tools.ffprobe_path)
+        plan = await planner.plan_split(input_file, chunk_duration, tolerance, boundaries=boundaries)
+        
+        # Chunks are independent, so they are cut in parallel
+        output_files = [f"{output_dir}/scene_{chunk['index']:03d}.mp4" for chunk in plan]
+        await ffmpeg_tools.load_capabilities()
+        encode_args = ffmpeg_tools.h264_args('fast', 23) + ['-c:a', 'aac']
+        results = await planner.cut_segments(input_file, plan, output_files, encode_args=encode_args)
+        
+        for result in results:
+            i = result["index"]
             
-            # FFmpeg command to extract chunk
-            cmd = [
-                'ffmpeg',
-                '-i', input_file,
-                '-ss', str(start_time),
-                '-t', str(chunk_duration),
-                '-c:v', 'libx264',
-                '-c:a', 'aac',
-                '-y',  # Overwrite output files
-                output_file
-            ]
+            # Durations come from the plan, so chunks are not re-probed
+            scene_info = {
+                "scene_id": f"scene_{i:03d}",
+                "file_path": result["file_path"],
+                "start_time": result["start_time"],
+                "duration": result["duration"],
+                "split_mode": result["mode"],
+                "status": "ready_for_ai",
+                "ai_status": "pending"
+            }
             
-            # Run ffmpeg
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                # Get actual duration of the chunk
-                actual_duration = await get_chunk_duration(output_file)
-                
-                scene_info = {
-                    "scene_id": f"scene_{i:03d}",
-                    "file_path": output_file,
-                    "start_time": start_time,
-                    "duration": actual_duration,
-                    "status": "ready_for_ai",
-                    "ai_status": "pending"
-                }
-                
-                scenes.append(scene_info)
-            else:
-                raise Exception(f"FFmpeg failed for chunk {i}: {result.stderr}")
+            scenes.append(scene_info)
         
         return scenes
         
     except Exception as e:
         raise Exception(f"Video splitting failed: {str(e)}")
 
-async def get_chunk_duration(file_path: str) -> float:
-    """
-    Get actual duration of a video chunk
-    """
-    try:
-        cmd = [
-            'ffprobe',
-            '-v', 'quiet',
-            '-print_format', 'json',
-            '-show_format',
-            file_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            return float(data['format']['duration'])
-        else:
-            return 8.0  # Default fallback
-            
-    except Exception:
-        return 8.0  # Default fallback
-
 @router.get("/scene-split/status/{job_id}")
 async def get_scene_split_status(job_id: str):
     """
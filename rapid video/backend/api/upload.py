@@ -6,6 +6,8 @@ from datetime import datetime
 from typing import Dict, Any
 import aiofiles
 
+from services.probe_cache import probe_cache
+
 router = APIRouter()
 
 # Initialize Firestore
@@ -109,29 +111,14 @@ async def get_upload_status(job_id: str):
 async def get_video_duration(file_path: str) -> float:
     """
     Get video duration using ffmpeg
+
+    The probe result is cached, so later stages reuse it instead of
+    running ffprobe on the upload again.
     """
     try:
-        import subprocess
-        import json
-        
-        cmd = [
-            'ffprobe',
-            '-v', 'quiet',
-            '-print_format', 'json',
-            '-show_format',
-            file_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        data = await probe_cache.probe(file_path)
+        return float(data['format']['duration'])
         
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            duration = float(data['format']['duration'])
-            return duration
-        else:
-            # Fallback duration if ffprobe fails
-            return 30.0
-            
     except Exception:
         # Default to 30 seconds if duration detection fails
         return 30.0
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+Benchmark shot-boundary detection speed against realtime on long inputs.
+
+    python benchmark_scene_detect.py
+    python benchmark_scene_detect.py --durations 300,1800 --shot-length 4 --repeat 3
+
+Test videos are synthesized with ffmpeg: testsrc2 with one of three other
+sources (smptehdbars, mandelbrot, rgbtestsrc) overlaid in turn, so the
+picture changes completely every ``--shot-length`` seconds. Each video is
+run through ShotDetector (one downscaled decode pass) and the report lists
+per duration:
+
+    detect_seconds   wall time of the pass
+    realtime_factor  video seconds processed per wall second
+    expected_cuts    shot changes put into the video
+    detected_cuts    expected cuts found within one frame
+    false_cuts       shot changes reported away from any expected cut
+    scenes           scenes ``scene_boundaries`` makes of them (max 8 s)
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+from services.shot_detector import DEFAULT_CUT_THRESHOLD, ShotDetector, scene_boundaries
+
+SOURCES = ('smptehdbars', 'mandelbrot', 'rgbtestsrc')
+FRAME_RATE = 30
+MIN_SCENE = 2.0
+MAX_SCENE = 8.0
+
+
+def synthesize(path, seconds, shot_length, ffmpeg_path):
+    shots = len(SOURCES) + 1
+    inputs = ['-f', 'lavfi', '-i', f"testsrc2=size=640x360:rate={FRAME_RATE}"]
+    chains = []
+    previous = '0:v'
+
+    for k, source in enumerate(SOURCES, start=1):
+        inputs += ['-f', 'lavfi', '-i', f"{source}=size=640x360:rate={FRAME_RATE}"]
+        label = f"v{k}"
+        chains.append(
+            f"[{previous}][{k}:v]overlay=enable='eq(mod(floor(t/{shot_length}),{shots}),{k})'[{label}]"
+        )
+        previous = label
+
+    cmd = [
+        ffmpeg_path, '-v', 'error',
+        *inputs,
+        '-filter_complex', ';'.join(chains),
+        '-map', f"[{previous}]",
+        '-t', str(seconds),
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '60',
+        '-y', path
+    ]
+    subprocess.run(cmd, check=True, capture_output=True)
+    return path
+
+
+def expected_cuts(seconds, shot_length):
+    cuts = []
+    t = shot_length
+    while t < seconds:
+        cuts.append(t)
+        t += shot_length
+    return cuts
+
+
+def match_cuts(found, expected, tolerance):
+    detected = sum(1 for t in expected if any(abs(t - f) <= tolerance for f in found))
+    false = sum(1 for f in found if all(abs(t - f) > tolerance for t in expected))
+    return detected, false
+
+
+def parse_list(value, cast):
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark shot detection speed vs realtime")
+    parser.add_argument('--durations', default='60,300,900', help="Video lengths in seconds")
+    parser.add_argument('--shot-length', type=float, default=5.0)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_CUT_THRESHOLD)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--ffmpeg', default='ffmpeg')
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    durations = sorted(parse_list(args.durations, float))
+    detector = ShotDetector(args.ffmpeg, args.threshold)
+    tolerance = 1.0 / FRAME_RATE + 1e-3
+
+    report = {'shot_length': args.shot_length, 'threshold': args.threshold,
+              'repeat': args.repeat, 'runs': []}
+
+    with tempfile.TemporaryDirectory(prefix='detect_bench_') as temp_dir:
+        for seconds in durations:
+            path = synthesize(os.path.join(temp_dir, f"input_{seconds:g}s.mp4"),
+                              seconds, args.shot_length, args.ffmpeg)
+
+            results = [asyncio.run(detector.detect(path)) for _ in range(args.repeat)]
+            elapsed = statistics.median(result['seconds'] for result in results)
+            result = results[-1]
+
+            found = [t for t, _ in result['shot_changes']]
+            expected = expected_cuts(seconds, args.shot_length)
+            detected, false = match_cuts(found, expected, tolerance)
+            scenes = scene_boundaries(result['shot_changes'], result['duration'], MIN_SCENE, MAX_SCENE)
+
+            entry = {
+                'duration': seconds,
+                'frames': result['frames'],
+                'detect_seconds': round(elapsed, 3),
+                'realtime_factor': round(seconds / elapsed, 2) if elapsed else None,
+                'expected_cuts': len(expected),
+                'detected_cuts': detected,
+                'false_cuts': false,
+                'scenes': len(scenes) + 1,
+            }
+            report['runs'].append(entry)
+            print(json.dumps(entry), file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark scene-split time against video duration for each seek mode.
+
+    python benchmark_split.py
+    python benchmark_split.py --durations 30,90,180 --modes output,accurate --repeat 3
+
+Test videos (testsrc2 + sine, 2 s GOP) are synthesized with ffmpeg, then
+cut sequentially into 8 s segments with re-encoding, one ffmpeg run per
+segment, so only the seek strategy differs between modes:
+
+    output    -ss after -i: every segment decodes from the start of the file
+              (the old behaviour, quadratic in duration)
+    accurate  input-side -ss plus a short output-side trim (frame accurate)
+    fast      input-side -ss only, starting on the previous keyframe
+
+For each mode the report lists split seconds per video, seconds per video
+second, and ``growth``: the per-second cost of the longest video divided by
+that of the shortest. Linear modes stay near 1.0; the output mode grows
+with duration.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+from services.split_planner import seek_arguments
+
+MODES = ('output', 'accurate', 'fast')
+SEGMENT_DURATION = 8.0
+
+
+def synthesize(path, seconds, ffmpeg_path):
+    cmd = [
+        ffmpeg_path, '-v', 'error',
+        '-f', 'lavfi', '-i', 'testsrc2=size=640x360:rate=30',
+        '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=44100',
+        '-t', str(seconds),
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '60',
+        '-c:a', 'aac',
+        '-y', path
+    ]
+    subprocess.run(cmd, check=True, capture_output=True)
+    return path
+
+
+def split_command(ffmpeg_path, input_path, output_path, start, mode):
+    if mode == 'output':
+        input_args, output_args = [], ['-ss', f"{start:.6f}"]
+    else:
+        input_args, output_args = seek_arguments(start, accurate=(mode == 'accurate'))
+
+    return [
+        ffmpeg_path, '-v', 'error',
+        *input_args,
+        '-i', input_path,
+        *output_args,
+        '-t', str(SEGMENT_DURATION),
+        '-c:v', 'libx264', '-preset', 'fast', '-crf', '23',
+        '-c:a', 'aac',
+        '-y', output_path
+    ]
+
+
+def time_split(ffmpeg_path, input_path, seconds, mode, output_dir):
+    start = time.perf_counter()
+    position = 0.0
+    index = 0
+    while position < seconds:
+        output_path = os.path.join(output_dir, f"segment_{index:03d}.mp4")
+        subprocess.run(split_command(ffmpeg_path, input_path, output_path, position, mode),
+                       check=True, capture_output=True)
+        position += SEGMENT_DURATION
+        index += 1
+    return time.perf_counter() - start
+
+
+def parse_list(value, cast):
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark split time vs duration per seek mode")
+    parser.add_argument('--durations', default='30,60,120,180', help="Video lengths in seconds")
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--ffmpeg', default='ffmpeg')
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    durations = sorted(parse_list(args.durations, float))
+    modes = parse_list(args.modes, str)
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"unknown mode(s): {', '.join(unknown)}; choose from {', '.join(MODES)}")
+
+    report = {'segment_duration': SEGMENT_DURATION, 'repeat': args.repeat, 'modes': {}}
+
+    with tempfile.TemporaryDirectory(prefix='split_bench_') as temp_dir:
+        inputs = {
+            seconds: synthesize(os.path.join(temp_dir, f"input_{seconds:g}s.mp4"), seconds, args.ffmpeg)
+            for seconds in durations
+        }
+        output_dir = os.path.join(temp_dir, 'segments')
+        os.makedirs(output_dir)
+
+        for mode in modes:
+            runs = []
+            for seconds in durations:
+                elapsed = statistics.median(
+                    time_split(args.ffmpeg, inputs[seconds], seconds, mode, output_dir)
+                    for _ in range(args.repeat)
+                )
+                entry = {
+                    'duration': seconds,
+                    'split_seconds': round(elapsed, 3),
+                    'seconds_per_video_second': round(elapsed / seconds, 4),
+                }
+                runs.append(entry)
+                print(json.dumps(dict(entry, mode=mode)), file=sys.stderr)
+
+            report['modes'][mode] = {
+                'runs': runs,
+                'growth': round(runs[-1]['seconds_per_video_second']
+                                / runs[0]['seconds_per_video_second'], 3),
+            }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+from pydantic import Field
 from pydantic_settings import BaseSettings
 from typing import Optional
 
@@ -45,11 +46,23 @@ class Settings(BaseSettings):
     
     # Processing Configuration
     SCENE_DURATION: int = 8  # seconds per scene
+    SCENE_STREAM_COPY: bool = True  # cut scenes with -c copy when they start/end on keyframes
+    SCENE_KEYFRAME_TOLERANCE: float = 0.5  # seconds a scene boundary may move to hit a keyframe
+    SCENE_DETECTION: bool = True  # cut scenes at detected shot changes instead of every SCENE_DURATION
+    SCENE_MIN_DURATION: float = Field(2.0, gt=0)  # shortest scene shot detection may produce
+    SHOT_CUT_THRESHOLD: float = 0.15  # frame change score (0-1) that counts as a shot change
+    MERGE_STREAM_COPY: bool = True  # concat scenes with -c copy when their streams match
+    SCENE_ANALYSIS_BATCH: int = 8  # scenes analyzed together (keyframes held in memory)
+    SPLIT_WORKERS: int = 0  # concurrent scene encodes per job, 0 = one per CPU core
     MAX_CONCURRENT_JOBS: int = 5
     
     # FFmpeg Configuration
     FFMPEG_PATH: str = "ffmpeg"
     FFPROBE_PATH: str = "ffprobe"
+    FFMPEG_TIMEOUT: Optional[int] = 1800  # seconds before a stuck ffmpeg/ffprobe is killed
+    PROBE_CACHE_SIZE: int = 256  # ffprobe results kept in memory (LRU)
+    FFMPEG_CAPABILITIES_CACHE: Optional[str] = None  # JSON file, defaults to the temp dir
+    FFMPEG_HW_ENCODE: bool = False  # prefer NVENC/QSV/VideoToolbox H.264 when available
     
     # Security
     SECRET_KEY: str = "your-secret-key-change-in-production"
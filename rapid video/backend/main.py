@@ -13,6 +13,8 @@ from api.scene_split import router as scene_split_router
 from api.ai_conversion import router as ai_conversion_router
 from api.merge import router as merge_router
 from api.payment import router as payment_router
+from services.ffmpeg_progress import encode_metrics
+from services.ffmpeg_tools import ffmpeg_tools
 
 # Initialize Firebase Admin
 if not firebase_admin._apps:
@@ -59,6 +61,14 @@ app.include_router(payment_router, prefix="/api", dependencies=[Depends(verify_t
 
 
 
+@app.on_event("startup")
+async def warm_ffmpeg_capabilities():
+    """Detect FFmpeg's encoders once, off the event loop, before serving requests"""
+    try:
+        await ffmpeg_tools.load_capabilities()
+    except Exception as e:
+        print(f"Warning: FFmpeg capability detection failed: {e}")
+
 @app.get("/")
 async def root():
     return {"message": "Rapid Video API is running"}
@@ -67,6 +77,11 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics/encode")
+async def encode_metrics_report():
+    """ffmpeg work per operation since startup (runs, wall/media seconds, speed, fps)"""
+    return encode_metrics.snapshot()
+
 
 
 if __name__ == "__main__":
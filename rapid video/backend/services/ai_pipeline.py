@@ -3,8 +3,6 @@ import json
 from typing import List, Dict, Optional, Any
 from datetime import datetime
 import base64
-import io
-from PIL import Image
 
 import google.generativeai as genai
 from google.cloud import aiplatform
@@ -13,6 +11,7 @@ import requests
 
 from ..config import settings
 from ..models.job import Job, ProcessingStage, update_job_progress
+from .frame_sampler import SampledFrame
 from .video_processor import video_processor
 
 class AIPipeline:
@@ -69,13 +68,21 @@ class AIPipeline:
             processed_scenes = []
             total_scenes = len(scene_paths)
             
+            batch_size = max(1, settings.SCENE_ANALYSIS_BATCH)
+            
             for i, scene_path in enumerate(scene_paths):
-                # Analyze scene content
-                scene_info = await video_processor.analyze_scene_content(scene_path)
+                # Analyze scene content, a batch of scenes at a time
+                if i % batch_size == 0:
+                    scene_infos = await video_processor.analyze_scenes(scene_paths[i:i + batch_size])
+                scene_info = scene_infos[i % batch_size]
                 
                 # Generate AI prompts for the scene
                 ai_prompts = await self.generate_scene_prompts(scene_path, scene_info)
                 
+                # The keyframe pixels are only needed for the prompts; keep
+                # metadata so memory stays bounded by the batch
+                scene_info['keyframes'] = [keyframe.metadata() for keyframe in scene_info.get('keyframes', [])]
+                
                 # Process with AI models
                 processed_scene = {
                     'scene_index': i + 1,
@@ -124,8 +131,8 @@ class AIPipeline:
             
             # Analyze keyframes with Gemini Vision
             keyframe_analysis = []
-            for keyframe_path in scene_info.get('keyframes', []):
-                analysis = await self._analyze_keyframe_with_gemini(keyframe_path)
+            for keyframe in scene_info.get('keyframes', []):
+                analysis = await self._analyze_keyframe_with_gemini(keyframe)
                 keyframe_analysis.append(analysis)
             
             # Generate comprehensive scene understanding
@@ -159,6 +166,7 @@ Scene Properties:
 - Duration: {scene_info.get('duration', 0):.1f} seconds
 - Resolution: {scene_info.get('resolution', 'unknown')}
 - Has Motion: {scene_info.get('has_motion', False)}
+- Motion Score: {scene_info.get('motion_score') or 0.0:.3f} (mean frame change, 0-1)
 - Brightness: {scene_info.get('brightness', 0.5):.2f}
 - Dominant Colors: {', '.join(scene_info.get('dominant_colors', []))}
 
@@ -174,15 +182,11 @@ Please provide a detailed analysis including:
 Format your response as JSON with keys: description, style, animation, lighting, camera, effects, audio
 """
     
-    async def _analyze_keyframe_with_gemini(self, keyframe_path: str) -> str:
+    async def _analyze_keyframe_with_gemini(self, keyframe: SampledFrame) -> str:
         """Analyze a keyframe image with Gemini Vision"""
         try:
-            # Load and encode image
-            with open(keyframe_path, 'rb') as f:
-                image_data = f.read()
-            
-            # Create image part for Gemini
-            image = Image.open(io.BytesIO(image_data))
+            # Create image part for Gemini straight from the decoded frame
+            image = keyframe.to_pil()
             
             prompt = """
 Analyze this video frame for 3D animation conversion. Describe:
@@ -0,0 +1,9 @@
+# The services are imported both as ``backend.services`` (from the pipeline
+# modules) and as a top-level ``services`` package (from main.py and the api
+# routers), so the app settings are resolved for either layout here, once.
+try:
+    from ..config import settings
+except ImportError:
+    from config import settings
+
+__all__ = ['settings']
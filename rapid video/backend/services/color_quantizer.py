@@ -0,0 +1,135 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+# Keyframes are reduced to a thumbnail of this size before counting colors
+COLOR_SAMPLE_SIZE = (150, 150)
+
+# Bits kept per channel: 4 -> 16 levels, 4096 color bins
+QUANTIZE_BITS = 4
+
+# Dominant colors closer than this (RGB distance) are treated as one
+MIN_COLOR_DISTANCE = 40.0
+
+# Most populated bins considered per image
+CANDIDATE_BINS = 32
+
+DEFAULT_COLOR = '#808080'
+
+
+class ColorQuantizer:
+    """
+    Dominant colors by histogram binning in a quantized RGB space
+
+    Pixels are binned on their top QUANTIZE_BITS bits per channel with a
+    single ``np.bincount``; the most populated bins win, each reported as
+    the mean color of its pixels, skipping bins too close to one already
+    chosen. There is no iterative clustering, so the cost is a fixed pass
+    over the thumbnail. A batch of keyframes (e.g. every scene of a job)
+    is binned as one array, and results are cached per keyframe by the
+    hash of its thumbnail. The cache is shared by the analysis threads,
+    so it is only touched under a lock.
+    """
+
+    def __init__(self, num_colors: int = 3, bits: int = QUANTIZE_BITS, cache_size: int = 1024):
+        self.num_colors = num_colors
+        self.bits = bits
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[bytes, List[str]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def dominant_colors(self, frame: Optional[np.ndarray]) -> List[str]:
+        """
+        Dominant colors of one RGB frame as hex strings
+        """
+        return self.dominant_colors_batch([frame])[0]
+
+    def dominant_colors_batch(self, frames: List[Optional[np.ndarray]]) -> List[List[str]]:
+        """
+        Dominant colors of every RGB frame, binned together as one array
+        """
+        results: List[Optional[List[str]]] = [None] * len(frames)
+        misses = []
+
+        for i, frame in enumerate(frames):
+            if frame is None:
+                results[i] = [DEFAULT_COLOR]
+                continue
+
+            thumbnail = cv2.resize(frame, COLOR_SAMPLE_SIZE, interpolation=cv2.INTER_AREA)
+            key = hashlib.blake2b(thumbnail.tobytes(), digest_size=16).digest()
+
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+
+            if cached is not None:
+                results[i] = cached
+            else:
+                misses.append((i, key, thumbnail))
+
+        if misses:
+            pixels = np.stack([thumbnail for _, _, thumbnail in misses]).reshape(len(misses), -1, 3)
+            for (i, key, _), colors in zip(misses, self._quantize(pixels)):
+                results[i] = colors
+                self._store(key, colors)
+
+        # Copies, so callers can't alter cached lists
+        return [list(colors) for colors in results]
+
+    def _quantize(self, pixels: np.ndarray) -> List[List[str]]:
+        """
+        (images, pixels, 3) uint8 -> dominant colors per image
+        """
+        images = pixels.shape[0]
+        bins = 1 << (3 * self.bits)
+        shift = 8 - self.bits
+
+        q = (pixels >> shift).astype(np.int64)
+        index = (q[..., 0] << (2 * self.bits)) | (q[..., 1] << self.bits) | q[..., 2]
+        # Offset every image into its own block of bins: one bincount for the batch
+        index = (index + np.arange(images)[:, None] * bins).ravel()
+
+        counts = np.bincount(index, minlength=images * bins).reshape(images, bins)
+        sums = np.stack([
+            np.bincount(index, weights=pixels[..., channel].ravel(), minlength=images * bins)
+            for channel in range(3)
+        ], axis=-1).reshape(images, bins, 3)
+
+        top = np.argsort(-counts, axis=1)[:, :CANDIDATE_BINS]
+        return [self._pick(counts[i, top[i]], sums[i, top[i]]) for i in range(images)]
+
+    def _pick(self, counts: np.ndarray, sums: np.ndarray) -> List[str]:
+        filled = counts > 0
+        means = sums[filled] / counts[filled][:, None]
+
+        chosen: List[int] = []
+        for i, color in enumerate(means):
+            if all(np.linalg.norm(color - means[j]) >= MIN_COLOR_DISTANCE for j in chosen):
+                chosen.append(i)
+            if len(chosen) == self.num_colors:
+                break
+
+        # Images with few distinct colors: fill up with the next most common bins
+        for i in range(len(means)):
+            if len(chosen) >= self.num_colors:
+                break
+            if i not in chosen:
+                chosen.append(i)
+
+        return ['#{:02x}{:02x}{:02x}'.format(*(int(round(c)) for c in means[i])) for i in chosen]
+
+    def _store(self, key: bytes, colors: List[str]):
+        with self._lock:
+            self._cache[key] = colors
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+# Global instance
+color_quantizer = ColorQuantizer()
@@ -0,0 +1,121 @@
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Called with each progress snapshot; may be a plain function or a coroutine function
+ProgressCallback = Callable[[Dict], Any]
+
+# stderr lines kept per ffmpeg run for error messages
+STDERR_TAIL_LINES = 200
+
+
+def _number(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        # "N/A" before the first frame is written
+        return None
+
+
+class ProgressParser:
+    """
+    Incremental parser of ffmpeg's ``-progress`` key=value stream
+
+    ffmpeg writes one block of ``key=value`` lines per update, closed by a
+    ``progress=continue`` (or ``progress=end``) line. ``feed`` returns a
+    snapshot when a block is complete and ``None`` otherwise.
+    """
+
+    def __init__(self, duration: Optional[float] = None):
+        self.duration = duration
+        self.started = time.monotonic()
+        self.last: Optional[Dict] = None
+        self._block: Dict[str, str] = {}
+
+    def feed(self, line: str) -> Optional[Dict]:
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            return None
+
+        self._block[key] = value.strip()
+        if key != 'progress':
+            return None
+
+        block, self._block = self._block, {}
+        self.last = self._snapshot(block)
+        return self.last
+
+    def _snapshot(self, block: Dict[str, str]) -> Dict:
+        # out_time_us and (despite its name) out_time_ms are both microseconds
+        out_time_us = _number(block.get('out_time_us', block.get('out_time_ms')))
+        out_time = max(0.0, out_time_us / 1_000_000) if out_time_us is not None else None
+        speed = _number(block.get('speed', '').rstrip('x'))
+        bitrate = _number(block.get('bitrate', '').replace('kbits/s', ''))
+        frame = _number(block.get('frame'))
+
+        snapshot = {
+            'frame': int(frame) if frame is not None else None,
+            'fps': _number(block.get('fps')),
+            'bitrate_kbps': bitrate,
+            'total_size': _number(block.get('total_size')),
+            'out_time': out_time,
+            'speed': speed,
+            'elapsed': time.monotonic() - self.started,
+            'done': block.get('progress') == 'end'
+        }
+
+        if self.duration and out_time is not None:
+            snapshot['percent'] = min(1.0, out_time / self.duration)
+        elif snapshot['done']:
+            snapshot['percent'] = 1.0
+
+        return snapshot
+
+
+class EncodeMetrics:
+    """
+    Running totals of ffmpeg work per operation
+
+    ``speed`` is media seconds produced per wall-clock second and ``fps``
+    frames per wall-clock second, both averaged over every run recorded.
+    """
+
+    def __init__(self):
+        self._operations: Dict[str, Dict] = {}
+
+    def record(self, operation: str, elapsed: float, snapshot: Optional[Dict], ok: bool):
+        totals = self._operations.setdefault(operation, {
+            'runs': 0,
+            'failures': 0,
+            'wall_seconds': 0.0,
+            'media_seconds': 0.0,
+            'frames': 0
+        })
+
+        totals['runs'] += 1
+        totals['failures'] += 0 if ok else 1
+        totals['wall_seconds'] += elapsed
+
+        if snapshot:
+            totals['media_seconds'] += snapshot.get('out_time') or 0.0
+            totals['frames'] += snapshot.get('frame') or 0
+            totals['last'] = snapshot
+
+    def snapshot(self) -> Dict:
+        """
+        Totals per operation with average speed and fps
+        """
+        report = {}
+        for operation, totals in self._operations.items():
+            wall = totals['wall_seconds']
+            report[operation] = dict(
+                totals,
+                speed=round(totals['media_seconds'] / wall, 3) if wall else None,
+                fps=round(totals['frames'] / wall, 1) if wall else None
+            )
+        return report
+
+    def reset(self):
+        self._operations.clear()
+
+# Global instance
+encode_metrics = EncodeMetrics()
@@ -1,93 +1,59 @@
-import subprocess
 import os
-import json
+import csv
 from typing import Dict, List, Optional
 import asyncio
 from datetime import datetime
 
+from .ffmpeg_progress import ProgressCallback
+from .ffmpeg_tools import FFmpegTools, ffmpeg_tools
+from .merge_planner import MergePlanner
+from .probe_cache import probe_cache
+from .process_runner import process_runner
+from .split_planner import (
+    SplitPlanner, DEFAULT_KEYFRAME_TOLERANCE, default_split_workers, seek_arguments
+)
+
 class FFmpegService:
     """
     Service for handling video processing with FFmpeg
+
+    Every ffmpeg/ffprobe call goes through ``process_runner``, so encodes
+    never block the event loop and share the MAX_CONCURRENT_JOBS limit.
+    Binaries and the H.264 encoder come from ``ffmpeg_tools``. Operations
+    taking ``on_progress`` report live fps, speed, out_time and bitrate
+    (see ``ffmpeg_progress``); all of them feed ``encode_metrics``.
     """
     
-    def __init__(self):
-        self.ffmpeg_path = self._find_ffmpeg()
-        self.ffprobe_path = self._find_ffprobe()
+    def __init__(self, tools: FFmpegTools = ffmpeg_tools):
+        # Binaries are resolved on first use, not at import time
+        self.tools = tools
     
-    def _find_ffmpeg(self) -> str:
-        """Find FFmpeg executable"""
-        try:
-            result = subprocess.run(['where', 'ffmpeg'], capture_output=True, text=True, shell=True)
-            if result.returncode == 0:
-                return 'ffmpeg'
-        except:
-            pass
-        
-        # Common installation paths
-        common_paths = [
-            'ffmpeg',
-            'C:\\ffmpeg\\bin\\ffmpeg.exe',
-            'C:\\Program Files\\ffmpeg\\bin\\ffmpeg.exe',
-            '/usr/bin/ffmpeg',
-            '/usr/local/bin/ffmpeg'
-        ]
-        
-        for path in common_paths:
-            try:
-                subprocess.run([path, '-version'], capture_output=True, check=True)
-                return path
-            except:
-                continue
-        
-        raise Exception("FFmpeg not found. Please install FFmpeg.")
+    @property
+    def ffmpeg_path(self) -> str:
+        return self.tools.ffmpeg_path
     
-    def _find_ffprobe(self) -> str:
-        """Find FFprobe executable"""
-        try:
-            result = subprocess.run(['where', 'ffprobe'], capture_output=True, text=True, shell=True)
-            if result.returncode == 0:
-                return 'ffprobe'
-        except:
-            pass
-        
-        # Common installation paths
-        common_paths = [
-            'ffprobe',
-            'C:\\ffmpeg\\bin\\ffprobe.exe',
-            'C:\\Program Files\\ffmpeg\\bin\\ffprobe.exe',
-            '/usr/bin/ffprobe',
-            '/usr/local/bin/ffprobe'
-        ]
-        
-        for path in common_paths:
-            try:
-                subprocess.run([path, '-version'], capture_output=True, check=True)
-                return path
-            except:
-                continue
+    @property
+    def ffprobe_path(self) -> str:
+        return self.tools.ffprobe_path
+    
+    async def _run_ffmpeg(self, cmd: List[str], operation: str, input_path: Optional[str] = None,
+                          on_progress: Optional[ProgressCallback] = None):
+        """
+        Run ffmpeg with progress reporting; ``input_path`` gives the duration for ``percent``
+        """
+        duration = None
+        if on_progress and input_path:
+            duration = (await self.get_video_info(input_path))['duration'] or None
         
-        raise Exception("FFprobe not found. Please install FFmpeg.")
+        return await process_runner.run_ffmpeg(cmd, operation, duration, on_progress)
     
     async def get_video_info(self, video_path: str) -> Dict:
         """
         Get comprehensive video information
         """
         try:
-            cmd = [
-                self.ffprobe_path,
-                '-v', 'quiet',
-                '-print_format', 'json',
-                '-show_format',
-                '-show_streams',
-                video_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                raise Exception(f"FFprobe failed: {result.stderr}")
-            
-            data = json.loads(result.stdout)
+            # Shared, parsed ffprobe output; re-probed only if the file changed
+            data = await probe_cache.probe(video_path)
             
             # Extract video stream info
             video_stream = None
@@ -124,10 +90,41 @@ class FFmpegService:
         except Exception as e:
             raise Exception(f"Failed to get video info: {str(e)}")
     
-    async def split_video(self, input_path: str, output_dir: str, segment_duration: float = 8.0) -> List[Dict]:
+    async def split_video(self, input_path: str, output_dir: str, segment_duration: float = 8.0,
+                          single_pass: bool = True, stream_copy: bool = True,
+                          keyframe_tolerance: float = DEFAULT_KEYFRAME_TOLERANCE,
+                          workers: Optional[int] = None, accurate: bool = True,
+                          on_progress: Optional[ProgressCallback] = None) -> List[Dict]:
         """
         Split video into segments
+
+        With ``stream_copy`` the cut points are snapped to source keyframes
+        and clean segments are copied without re-encoding, cut by up to
+        ``workers`` concurrent ffmpeg processes (default: one per core).
+        When nothing can be copied, all segments come out of one ffmpeg run
+        with the segment muxer. ``single_pass=False`` instead encodes each
+        segment separately: in parallel with several workers, otherwise
+        one after another. ``accurate=False`` lets re-encoded segments
+        start on the keyframe before their boundary instead of the exact
+        frame. ``on_progress`` follows the single-pass encode.
         """
+        workers = workers or default_split_workers()
+        await self.tools.load_capabilities()
+        
+        if stream_copy or (workers > 1 and not single_pass):
+            planner = SplitPlanner(self.ffmpeg_path, self.ffprobe_path, accurate)
+            plan = await planner.plan_split(input_path, segment_duration, keyframe_tolerance)
+            if not stream_copy:
+                plan = [dict(segment, mode='encode') for segment in plan]
+            
+            has_copies = any(segment['mode'] == 'copy' for segment in plan)
+            if has_copies or (workers > 1 and not single_pass):
+                return await self._split_video_planned(planner, input_path, output_dir, plan, workers)
+        
+        if single_pass:
+            return await self._split_video_single_pass(input_path, output_dir, segment_duration,
+                                                       on_progress)
+
         try:
             os.makedirs(output_dir, exist_ok=True)
             
@@ -143,20 +140,22 @@ class FFmpegService:
                 segment_duration_actual = min(segment_duration, total_duration - current_time)
                 output_file = os.path.join(output_dir, f"segment_{segment_count:03d}.mp4")
                 
+                # Input-side seek: each segment no longer decodes from the start
+                input_args, output_args = seek_arguments(current_time, accurate)
+                
                 cmd = [
                     self.ffmpeg_path,
+                    *input_args,
                     '-i', input_path,
-                    '-ss', str(current_time),
+                    *output_args,
                     '-t', str(segment_duration_actual),
-                    '-c:v', 'libx264',
+                    *self.tools.h264_args('fast', 23),
                     '-c:a', 'aac',
-                    '-preset', 'fast',
-                    '-crf', '23',
                     '-y',
                     output_file
                 ]
                 
-                result = subprocess.run(cmd, capture_output=True, text=True)
+                result = await self._run_ffmpeg(cmd, 'split_segment')
                 
                 if result.returncode != 0:
                     raise Exception(f"Segment {segment_count} failed: {result.stderr}")
@@ -181,47 +180,116 @@ class FFmpegService:
         except Exception as e:
             raise Exception(f"Video splitting failed: {str(e)}")
     
-    async def merge_videos(self, video_files: List[str], output_path: str) -> str:
+    async def _split_video_single_pass(self, input_path: str, output_dir: str,
+                                       segment_duration: float,
+                                       on_progress: Optional[ProgressCallback] = None) -> List[Dict]:
         """
-        Merge multiple video files into one
+        Encode the input once and let the segment muxer cut it.
+
+        Keyframes are forced on every segment boundary so each segment starts
+        cleanly, and the segment list CSV gives the exact start/end of every
+        output, so no segment has to be probed afterwards.
         """
         try:
-            # Create concat file
-            concat_file = output_path.replace('.mp4', '_concat.txt')
+            os.makedirs(output_dir, exist_ok=True)
             
-            with open(concat_file, 'w') as f:
-                for video_file in video_files:
-                    if os.path.exists(video_file):
-                        f.write(f"file '{os.path.abspath(video_file)}'\n")
+            list_file = os.path.join(output_dir, 'segments.csv')
+            output_pattern = os.path.join(output_dir, 'segment_%03d.mp4')
             
             cmd = [
                 self.ffmpeg_path,
-                '-f', 'concat',
-                '-safe', '0',
-                '-i', concat_file,
-                '-c:v', 'libx264',
+                '-i', input_path,
+                *self.tools.h264_args('fast', 23),
                 '-c:a', 'aac',
-                '-preset', 'medium',
-                '-crf', '23',
+                '-force_key_frames', f'expr:gte(t,n_forced*{segment_duration})',
+                '-f', 'segment',
+                '-segment_time', str(segment_duration),
+                '-segment_list', list_file,
+                '-segment_list_type', 'csv',
+                '-reset_timestamps', '1',
                 '-y',
-                output_path
+                output_pattern
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = await self._run_ffmpeg(cmd, 'split', input_path, on_progress)
             
             if result.returncode != 0:
-                raise Exception(f"Video merge failed: {result.stderr}")
+                raise Exception(f"Segmenting failed: {result.stderr}")
+            
+            segments = self._read_segment_list(list_file, output_dir)
+            os.remove(list_file)
+            
+            return segments
+            
+        except Exception as e:
+            raise Exception(f"Video splitting failed: {str(e)}")
+    
+    async def _split_video_planned(self, planner: SplitPlanner, input_path: str,
+                                   output_dir: str, plan: List[Dict], workers: int) -> List[Dict]:
+        """
+        Cut the planned segments in parallel, stream-copying where the plan allows it
+        """
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+            
+            output_files = [
+                os.path.join(output_dir, f"segment_{segment['index']:03d}.mp4")
+                for segment in plan
+            ]
+            
+            encode_args = self.tools.h264_args('fast', 23) + ['-c:a', 'aac']
+            return await planner.cut_segments(input_path, plan, output_files, workers, encode_args)
+            
+        except Exception as e:
+            raise Exception(f"Video splitting failed: {str(e)}")
+    
+    def _read_segment_list(self, list_file: str, output_dir: str) -> List[Dict]:
+        """
+        Parse a segment muxer CSV list (``filename,start,end`` per row)
+        """
+        segments = []
+        
+        with open(list_file, newline='') as f:
+            for row in csv.reader(f):
+                if len(row) < 3:
+                    continue
+                
+                output_file = os.path.join(output_dir, row[0])
+                start_time = float(row[1])
+                end_time = float(row[2])
+                
+                segments.append({
+                    'index': len(segments),
+                    'file_path': output_file,
+                    'start_time': start_time,
+                    'duration': end_time - start_time,
+                    'size': os.path.getsize(output_file)
+                })
+        
+        return segments
+    
+    async def merge_videos(self, video_files: List[str], output_path: str,
+                           stream_copy: bool = True) -> str:
+        """
+        Merge multiple video files into one
+        
+        Stream-copies when all files share their codec parameters and only
+        re-encodes the mismatched ones (see MergePlanner).
+        """
+        try:
+            existing = [video_file for video_file in video_files if os.path.exists(video_file)]
+            await self.tools.load_capabilities()
+            encode_args = self.tools.h264_args('medium', 23) + ['-c:a', 'aac']
             
-            # Clean up concat file
-            if os.path.exists(concat_file):
-                os.remove(concat_file)
+            await MergePlanner(self.ffmpeg_path).merge(existing, output_path, encode_args, stream_copy)
             
             return output_path
             
         except Exception as e:
             raise Exception(f"Video merging failed: {str(e)}")
     
-    async def extract_audio(self, video_path: str, output_path: str, format: str = 'wav') -> str:
+    async def extract_audio(self, video_path: str, output_path: str, format: str = 'wav',
+                            on_progress: Optional[ProgressCallback] = None) -> str:
         """
         Extract audio from video
         """
@@ -237,7 +305,7 @@ class FFmpegService:
                 output_path
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = await self._run_ffmpeg(cmd, 'extract_audio', video_path, on_progress)
             
             if result.returncode != 0:
                 raise Exception(f"Audio extraction failed: {result.stderr}")
@@ -247,7 +315,8 @@ class FFmpegService:
         except Exception as e:
             raise Exception(f"Audio extraction failed: {str(e)}")
     
-    async def combine_video_audio(self, video_path: str, audio_path: str, output_path: str) -> str:
+    async def combine_video_audio(self, video_path: str, audio_path: str, output_path: str,
+                                  on_progress: Optional[ProgressCallback] = None) -> str:
         """
         Combine video and audio files
         """
@@ -264,7 +333,7 @@ class FFmpegService:
                 output_path
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = await self._run_ffmpeg(cmd, 'combine_video_audio', video_path, on_progress)
             
             if result.returncode != 0:
                 raise Exception(f"Video-audio combination failed: {result.stderr}")
@@ -274,7 +343,8 @@ class FFmpegService:
         except Exception as e:
             raise Exception(f"Video-audio combination failed: {str(e)}")
     
-    async def resize_video(self, input_path: str, output_path: str, width: int, height: int) -> str:
+    async def resize_video(self, input_path: str, output_path: str, width: int, height: int,
+                           on_progress: Optional[ProgressCallback] = None) -> str:
         """
         Resize video to specified dimensions
         """
@@ -288,7 +358,7 @@ class FFmpegService:
                 output_path
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = await self._run_ffmpeg(cmd, 'resize', input_path, on_progress)
             
             if result.returncode != 0:
                 raise Exception(f"Video resize failed: {result.stderr}")
@@ -298,22 +368,29 @@ class FFmpegService:
         except Exception as e:
             raise Exception(f"Video resize failed: {str(e)}")
     
-    async def create_thumbnail(self, video_path: str, output_path: str, timestamp: float = 1.0) -> str:
+    async def create_thumbnail(self, video_path: str, output_path: str, timestamp: float = 1.0,
+                               accurate: bool = True) -> str:
         """
         Create thumbnail from video at specified timestamp
+
+        ``accurate=False`` grabs the keyframe at or before ``timestamp``,
+        which needs no decoding past that keyframe.
         """
         try:
+            input_args, output_args = seek_arguments(timestamp, accurate)
+            
             cmd = [
                 self.ffmpeg_path,
+                *input_args,
                 '-i', video_path,
-                '-ss', str(timestamp),
+                *output_args,
                 '-vframes', '1',
                 '-q:v', '2',
                 '-y',
                 output_path
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = await self._run_ffmpeg(cmd, 'thumbnail')
             
             if result.returncode != 0:
                 raise Exception(f"Thumbnail creation failed: {result.stderr}")
@@ -323,24 +400,24 @@ class FFmpegService:
         except Exception as e:
             raise Exception(f"Thumbnail creation failed: {str(e)}")
     
-    async def compress_video(self, input_path: str, output_path: str, crf: int = 28) -> str:
+    async def compress_video(self, input_path: str, output_path: str, crf: int = 28,
+                             on_progress: Optional[ProgressCallback] = None) -> str:
         """
         Compress video with specified quality
         """
         try:
+            await self.tools.load_capabilities()
             cmd = [
                 self.ffmpeg_path,
                 '-i', input_path,
-                '-c:v', 'libx264',
-                '-crf', str(crf),
-                '-preset', 'medium',
+                *self.tools.h264_args('medium', crf),
                 '-c:a', 'aac',
                 '-b:a', '128k',
                 '-y',
                 output_path
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = await self._run_ffmpeg(cmd, 'compress', input_path, on_progress)
             
             if result.returncode != 0:
                 raise Exception(f"Video compression failed: {result.stderr}")
@@ -0,0 +1,195 @@
+import os
+import re
+import asyncio
+import json
+import shutil
+import subprocess
+import tempfile
+import threading
+from typing import Dict, List, Optional
+
+from .app_config import settings
+
+# Places FFmpeg is commonly installed when it is not on PATH
+COMMON_DIRS = [
+    '/usr/bin',
+    '/usr/local/bin',
+    '/opt/homebrew/bin',
+    'C:\\ffmpeg\\bin',
+    'C:\\Program Files\\ffmpeg\\bin'
+]
+
+# H.264 encoders in order of preference; hardware ones only with FFMPEG_HW_ENCODE
+HARDWARE_H264_ENCODERS = ['h264_nvenc', 'h264_qsv', 'h264_videotoolbox']
+SOFTWARE_H264_ENCODERS = ['libx264', 'libopenh264']
+
+# Bump when the cached capability layout changes
+CACHE_VERSION = 1
+
+
+class FFmpegTools:
+    """
+    Lazy FFmpeg/FFprobe discovery and capability detection
+
+    Nothing runs until a path or capability is first needed. The configured
+    FFMPEG_PATH/FFPROBE_PATH win; otherwise the binaries are looked up on
+    PATH and in the usual install directories. Encoders, filters and
+    hwaccels are listed once and cached on disk, keyed by the binary's path,
+    size and mtime, so later worker boots read them back without spawning
+    ffmpeg at all. Detection runs ffmpeg synchronously, so async callers
+    await ``load_capabilities()`` (warmed at startup) before picking an
+    encoder rather than detecting on the event loop.
+    """
+
+    def __init__(self, ffmpeg_path: str = 'ffmpeg', ffprobe_path: str = 'ffprobe',
+                 cache_path: Optional[str] = None, hw_encode: bool = False):
+        self.configured_ffmpeg = ffmpeg_path
+        self.configured_ffprobe = ffprobe_path
+        self.cache_path = cache_path or os.path.join(tempfile.gettempdir(), 'rapid_video_ffmpeg.json')
+        self.hw_encode = hw_encode
+        self._lock = threading.RLock()
+        self._paths: Dict[str, str] = {}
+        self._capabilities: Optional[Dict] = None
+
+    @property
+    def ffmpeg_path(self) -> str:
+        return self._resolve('ffmpeg', self.configured_ffmpeg)
+
+    @property
+    def ffprobe_path(self) -> str:
+        return self._resolve('ffprobe', self.configured_ffprobe)
+
+    def _resolve(self, name: str, configured: str) -> str:
+        if name in self._paths:
+            return self._paths[name]
+
+        with self._lock:
+            if name not in self._paths:
+                self._paths[name] = self._find(name, configured)
+            return self._paths[name]
+
+    def _find(self, name: str, configured: str) -> str:
+        """Resolve an executable without running it"""
+        candidates = [configured, name]
+        for directory in COMMON_DIRS:
+            candidates.append(os.path.join(directory, name))
+            candidates.append(os.path.join(directory, f"{name}.exe"))
+
+        for candidate in candidates:
+            found = shutil.which(candidate)
+            if found:
+                return found
+
+        raise Exception(f"{name} not found. Please install FFmpeg or set {name.upper()}_PATH.")
+
+    @property
+    def capabilities(self) -> Dict:
+        """
+        Version, encoders, filters and hwaccels of the resolved ffmpeg
+        """
+        if self._capabilities is None:
+            with self._lock:
+                if self._capabilities is None:
+                    self._capabilities = self._load_capabilities()
+        return self._capabilities
+
+    async def load_capabilities(self) -> Dict:
+        """
+        ``capabilities`` without blocking the event loop on first detection
+        """
+        if self._capabilities is not None:
+            return self._capabilities
+        return await asyncio.to_thread(lambda: self.capabilities)
+
+    def _binary_signature(self, path: str) -> Dict:
+        stat = os.stat(path)
+        return {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'version': CACHE_VERSION}
+
+    def _load_capabilities(self) -> Dict:
+        ffmpeg_path = self.ffmpeg_path
+        signature = self._binary_signature(ffmpeg_path)
+
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+            if cached.get('signature') == signature:
+                return cached['capabilities']
+        except (OSError, ValueError, KeyError):
+            pass
+
+        capabilities = self._detect(ffmpeg_path)
+
+        # Write atomically so concurrent workers never read a partial file
+        try:
+            temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({'signature': signature, 'capabilities': capabilities}, f)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            print(f"Warning: could not cache FFmpeg capabilities: {e}")
+
+        return capabilities
+
+    def _list(self, ffmpeg_path: str, option: str) -> str:
+        result = subprocess.run([ffmpeg_path, '-hide_banner', option], capture_output=True, text=True)
+        return result.stdout if result.returncode == 0 else ''
+
+    def _detect(self, ffmpeg_path: str) -> Dict:
+        version_output = self._list(ffmpeg_path, '-version')
+        version = version_output.split('\n', 1)[0].replace('ffmpeg version ', '').split(' ')[0]
+
+        # " V....D libx264   libx264 H.264 / AVC ..." -> libx264
+        encoders = re.findall(r'^\s[VAS][\w.]{5}\s+(\S+)', self._list(ffmpeg_path, '-encoders'), re.M)
+        encoders = [name for name in encoders if name != '=']  # legend lines
+        # " ... amix   N->A   Audio mixing." -> amix
+        filters = re.findall(r'^\s[TSC.]{3}\s+(\S+)\s+\S+->\S+', self._list(ffmpeg_path, '-filters'), re.M)
+        hwaccels = [
+            line.strip() for line in self._list(ffmpeg_path, '-hwaccels').splitlines()[1:]
+            if line.strip()
+        ]
+
+        return {
+            'version': version,
+            'encoders': sorted(set(encoders)),
+            'filters': sorted(set(filters)),
+            'hwaccels': hwaccels
+        }
+
+    def has_encoder(self, name: str) -> bool:
+        return name in self.capabilities['encoders']
+
+    def has_filter(self, name: str) -> bool:
+        return name in self.capabilities['filters']
+
+    def h264_encoder(self) -> str:
+        """
+        Fastest available H.264 encoder (hardware only when enabled)
+        """
+        preferred = (HARDWARE_H264_ENCODERS if self.hw_encode else []) + SOFTWARE_H264_ENCODERS
+        for encoder in preferred:
+            if self.has_encoder(encoder):
+                return encoder
+        # Let ffmpeg report the missing encoder with its own error
+        return 'libx264'
+
+    def h264_args(self, preset: str = 'medium', crf: int = 23) -> List[str]:
+        """
+        ``-c:v`` arguments for the chosen H.264 encoder at roughly libx264's ``crf``
+        """
+        encoder = self.h264_encoder()
+
+        if encoder == 'libx264':
+            return ['-c:v', 'libx264', '-preset', preset, '-crf', str(crf)]
+        if encoder == 'h264_nvenc':
+            return ['-c:v', 'h264_nvenc', '-preset', 'p4', '-rc', 'vbr', '-cq', str(crf)]
+        if encoder == 'h264_qsv':
+            return ['-c:v', 'h264_qsv', '-global_quality', str(crf)]
+        return ['-c:v', encoder, '-b:v', settings.OUTPUT_VIDEO_BITRATE]
+
+# Global instance
+ffmpeg_tools = FFmpegTools(
+    settings.FFMPEG_PATH,
+    settings.FFPROBE_PATH,
+    settings.FFMPEG_CAPABILITIES_CACHE,
+    settings.FFMPEG_HW_ENCODE
+)
@@ -0,0 +1,68 @@
+from typing import List, Optional
+
+
+class FilterGraph:
+    """
+    Builder for a single ffmpeg invocation with a ``-filter_complex`` graph
+
+    Inputs are numbered in the order they are added. ``chain`` appends one
+    filter chain and returns its output label, which can feed later chains
+    or be mapped to the output, so a whole render (concat, audio filters,
+    generated sources, mixing and the mux) runs as one process without
+    intermediate files.
+    """
+
+    def __init__(self):
+        self.inputs: List[List[str]] = []
+        self.chains: List[str] = []
+        self._label_count = 0
+
+    def add_input(self, path: str, *options: str) -> int:
+        """
+        Add an input (``options`` go before its ``-i``) and return its index
+        """
+        self.inputs.append([*options, '-i', path])
+        return len(self.inputs) - 1
+
+    def add_lavfi(self, source: str) -> int:
+        """
+        Add a generated lavfi source such as ``sine=frequency=220``
+        """
+        return self.add_input(source, '-f', 'lavfi')
+
+    def _pad(self, stream: str) -> str:
+        # Both "0:a:0" input streams and "[mix]" labels are accepted
+        return stream if stream.startswith('[') else f"[{stream}]"
+
+    def chain(self, inputs: List[str], filters: List[str], output: Optional[str] = None) -> str:
+        """
+        Append ``inputs`` -> ``filters`` -> ``output`` and return the output label
+        """
+        if output is None:
+            output = f"s{self._label_count}"
+            self._label_count += 1
+
+        label = f"[{output}]"
+        pads = ''.join(self._pad(stream) for stream in inputs)
+        self.chains.append(f"{pads}{','.join(filters)}{label}")
+        return label
+
+    def filter_complex(self) -> str:
+        return ';'.join(self.chains)
+
+    def command(self, ffmpeg_path: str, maps: List[str], output_args: List[str],
+                output_path: str) -> List[str]:
+        """
+        Full ffmpeg command writing the mapped streams to ``output_path``
+        """
+        cmd = [ffmpeg_path]
+        for input_args in self.inputs:
+            cmd += input_args
+
+        if self.chains:
+            cmd += ['-filter_complex', self.filter_complex()]
+
+        for stream in maps:
+            cmd += ['-map', stream]
+
+        return [*cmd, *output_args, '-y', output_path]
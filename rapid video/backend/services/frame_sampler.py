@@ -0,0 +1,98 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+def sample_points(duration: float, fps: float, num_frames: int) -> Tuple[List[float], List[int]]:
+    """
+    Timestamps and frame numbers of ``num_frames`` evenly spaced samples
+
+    Sample ``i`` of ``n`` sits at ``duration * (i + 1) / (n + 1)``, as the
+    per-frame ffmpeg seeks did.
+    """
+    timestamps = [duration * (i + 1) / (num_frames + 1) for i in range(num_frames)]
+    return timestamps, [int(round(timestamp * fps)) for timestamp in timestamps]
+
+
+class SampledFrame:
+    """
+    One decoded frame, kept in memory as an RGB array
+
+    Nothing is written to disk unless a consumer asks for a file with
+    ``save_jpeg``.
+    """
+
+    def __init__(self, index: int, timestamp: float, image: np.ndarray):
+        self.index = index
+        self.timestamp = timestamp
+        self.image = image
+        self.path: Optional[str] = None
+
+    def metadata(self) -> Dict:
+        """JSON-serializable description of the frame, without the pixels"""
+        return {'index': self.index, 'timestamp': self.timestamp, 'path': self.path}
+
+    def to_pil(self) -> Image.Image:
+        return Image.fromarray(self.image)
+
+    def save_jpeg(self, path: str, quality: int = 90) -> str:
+        self.to_pil().save(path, 'JPEG', quality=quality)
+        self.path = path
+        return path
+
+
+class FrameSampler:
+    """
+    Evenly spaced frames of a video from a single decode pass
+
+    Frames are read sequentially from one ``cv2.VideoCapture``; frames
+    between the samples are only grabbed, never converted or copied, and
+    reading stops after the last sample (see ``sample_points``).
+    """
+
+    def sample_sync(self, video_path: str, num_frames: int = 3,
+                    duration: Optional[float] = None) -> List[SampledFrame]:
+        cap = cv2.VideoCapture(video_path)
+        try:
+            if not cap.isOpened():
+                raise Exception(f"Cannot open {video_path}")
+
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+            if not duration:
+                duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps
+
+            timestamps, targets = sample_points(duration, fps, num_frames)
+            wanted = set(targets)
+
+            decoded = {}
+            position = 0
+            last_target = max(targets) if targets else -1
+
+            while position <= last_target and cap.grab():
+                if position in wanted:
+                    ok, bgr = cap.retrieve()
+                    if ok:
+                        decoded[position] = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+                position += 1
+
+            return [
+                SampledFrame(i, timestamp, decoded[target])
+                for i, (timestamp, target) in enumerate(zip(timestamps, targets))
+                if target in decoded
+            ]
+
+        finally:
+            cap.release()
+
+    async def sample(self, video_path: str, num_frames: int = 3,
+                     duration: Optional[float] = None) -> List[SampledFrame]:
+        """
+        ``sample_sync`` on a worker thread, so decoding never blocks the event loop
+        """
+        return await asyncio.to_thread(self.sample_sync, video_path, num_frames, duration)
+
+# Global instance
+frame_sampler = FrameSampler()
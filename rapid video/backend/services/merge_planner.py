@@ -0,0 +1,238 @@
+import os
+import asyncio
+from collections import Counter
+from typing import Dict, List, Optional
+
+from .probe_cache import probe_cache, first_stream
+from .process_runner import process_runner
+from .split_planner import COPYABLE_CODECS, DEFAULT_ENCODE_ARGS
+
+# ffprobe profile names -> libx264 ``-profile:v`` values a normalized scene must match
+X264_PROFILES = {
+    'Constrained Baseline': 'baseline',
+    'Baseline': 'baseline',
+    'Main': 'main',
+    'High': 'high'
+}
+
+
+def write_concat_list(video_files: List[str], list_path: str) -> str:
+    """
+    Write an ffmpeg concat demuxer list, quoting paths that contain quotes
+    """
+    with open(list_path, 'w') as f:
+        for video_file in video_files:
+            escaped = os.path.abspath(video_file).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    return list_path
+
+
+class MergePlanner:
+    """
+    Merge scene files with a stream-copy concat whenever the streams allow it.
+
+    The concat demuxer can only ``-c copy`` files whose streams agree on
+    codec, profile, resolution, pixel format, timebase, frame rate and audio
+    layout. Those parameters come from the shared probe cache; the most
+    common set is the reference. Scenes that already match are copied as
+    they are, only the mismatched ones are re-encoded to the reference
+    first. When that is not possible (no H.264 reference, or no libx264 to
+    normalize with) the whole list is re-encoded as before.
+    """
+
+    def __init__(self, ffmpeg_path: str = 'ffmpeg'):
+        self.ffmpeg_path = ffmpeg_path
+
+    def stream_signature(self, probe: Dict) -> Dict:
+        """
+        Concat-relevant parameters of a probed file
+        """
+        video = first_stream(probe, 'video') or {}
+        audio = first_stream(probe, 'audio')
+
+        return {
+            'codec': video.get('codec_name'),
+            'profile': video.get('profile'),
+            'width': video.get('width'),
+            'height': video.get('height'),
+            'pix_fmt': video.get('pix_fmt'),
+            'time_base': video.get('time_base'),
+            'frame_rate': video.get('r_frame_rate'),
+            'audio': {
+                'codec': audio.get('codec_name'),
+                'sample_rate': audio.get('sample_rate'),
+                'channels': audio.get('channels')
+            } if audio else None
+        }
+
+    async def plan_merge(self, video_files: List[str],
+                         encode_args: Optional[List[str]] = None) -> Dict:
+        """
+        Decide how to merge ``video_files``: 'copy', 'normalize' or 'encode'
+        """
+        probes = await asyncio.gather(*(probe_cache.probe(path) for path in video_files))
+        signatures = [self.stream_signature(probe) for probe in probes]
+
+        # Counter keeps first-seen order among ties, so the earliest scene wins
+        counts = Counter(repr(signature) for signature in signatures)
+        reference_key = counts.most_common(1)[0][0] if counts else None
+        reference = next((s for s in signatures if repr(s) == reference_key), None)
+
+        scenes = [
+            {'path': path, 'signature': signature, 'normalize': repr(signature) != reference_key}
+            for path, signature in zip(video_files, signatures)
+        ]
+        mismatched = sum(scene['normalize'] for scene in scenes)
+
+        if not reference or reference['codec'] not in COPYABLE_CODECS:
+            mode = 'encode'
+        elif not mismatched:
+            mode = 'copy'
+        elif self._can_normalize(reference, encode_args):
+            mode = 'normalize'
+        else:
+            mode = 'encode'
+
+        return {'mode': mode, 'reference': reference, 'scenes': scenes, 'mismatched': mismatched}
+
+    def _can_normalize(self, reference: Dict, encode_args: Optional[List[str]]) -> bool:
+        args = encode_args or DEFAULT_ENCODE_ARGS
+        encoder = args[args.index('-c:v') + 1] if '-c:v' in args else None
+        audio = reference['audio']
+        # Only libx264 can be pinned to the reference's profile and pixel format
+        return (reference['codec'] == 'h264' and encoder == 'libx264'
+                and reference['profile'] in X264_PROFILES
+                and (audio is None or audio['codec'] == 'aac'))
+
+    def normalize_command(self, input_path: str, output_path: str, signature: Dict,
+                          reference: Dict, encode_args: Optional[List[str]] = None) -> List[str]:
+        """
+        ffmpeg command that re-encodes one scene to the reference parameters
+        """
+        video_filter = (f"scale={reference['width']}:{reference['height']},"
+                        f"fps={reference['frame_rate']},format={reference['pix_fmt']}")
+        timescale = reference['time_base'].split('/')[-1]
+
+        cmd = [self.ffmpeg_path, '-i', input_path]
+        audio = reference['audio']
+
+        if audio is None:
+            audio_args = ['-an']
+        else:
+            audio_args = [
+                '-c:a', 'aac',
+                '-ar', str(audio['sample_rate']),
+                '-ac', str(audio['channels'])
+            ]
+            if signature['audio'] is None:
+                # A scene without audio gets silence, so every part has the same streams
+                layout = 'mono' if audio['channels'] == 1 else 'stereo'
+                cmd += ['-f', 'lavfi', '-i', f"anullsrc=r={audio['sample_rate']}:cl={layout}"]
+                audio_args = ['-map', '0:v:0', '-map', '1:a:0', '-shortest', *audio_args]
+
+        return [
+            *cmd,
+            '-vf', video_filter,
+            *(encode_args or DEFAULT_ENCODE_ARGS),
+            '-profile:v', X264_PROFILES[reference['profile']],
+            '-video_track_timescale', timescale,
+            *audio_args,
+            '-y',
+            output_path
+        ]
+
+    def concat_command(self, list_path: str, output_path: str,
+                       encode_args: Optional[List[str]] = None) -> List[str]:
+        """
+        Concat demuxer command; ``encode_args=None`` stream-copies
+        """
+        codec_args = list(encode_args) if encode_args is not None else ['-c', 'copy']
+        return [
+            self.ffmpeg_path,
+            '-f', 'concat',
+            '-safe', '0',
+            '-i', list_path,
+            *codec_args,
+            '-movflags', '+faststart',
+            '-y',
+            output_path
+        ]
+
+    async def merge(self, video_files: List[str], output_path: str,
+                    encode_args: Optional[List[str]] = None, stream_copy: bool = True) -> Dict:
+        """
+        Merge ``video_files`` into ``output_path`` as cheaply as the streams allow
+
+        ``encode_args`` are the codec arguments of the full re-encode, which
+        is used when the scenes cannot be copied (and as the fallback if a
+        copy fails). Returns the plan with the mode that was actually used.
+        """
+        encode_args = list(encode_args or DEFAULT_ENCODE_ARGS)
+        plan = await self.plan_merge(video_files, encode_args)
+        if not stream_copy:
+            plan['mode'] = 'encode'
+
+        work_dir = f"{os.path.splitext(output_path)[0]}_parts"
+        list_path = f"{os.path.splitext(output_path)[0]}_concat.txt"
+        parts = list(video_files)
+
+        try:
+            if plan['mode'] == 'normalize':
+                os.makedirs(work_dir, exist_ok=True)
+                parts = await self._normalize(plan, work_dir, encode_args)
+
+            write_concat_list(parts, list_path)
+
+            if plan['mode'] != 'encode':
+                result = await process_runner.run_ffmpeg(self.concat_command(list_path, output_path), 'merge')
+                if result.returncode == 0:
+                    return plan
+                # Something the probe did not catch: fall back to the full re-encode
+                write_concat_list(video_files, list_path)
+                plan = dict(plan, mode='encode')
+
+            result = await process_runner.run_ffmpeg(
+                self.concat_command(list_path, output_path, encode_args), 'merge'
+            )
+            if result.returncode != 0:
+                raise Exception(f"Video merge failed: {result.stderr}")
+
+            return plan
+
+        finally:
+            if os.path.exists(list_path):
+                os.remove(list_path)
+            for scene in plan['scenes']:
+                normalized = scene.get('normalized_path')
+                if normalized and os.path.exists(normalized):
+                    os.remove(normalized)
+            if os.path.isdir(work_dir) and not os.listdir(work_dir):
+                os.rmdir(work_dir)
+
+    async def _normalize(self, plan: Dict, work_dir: str, encode_args: List[str]) -> List[str]:
+        async def normalize(index: int, scene: Dict) -> str:
+            if not scene['normalize']:
+                return scene['path']
+
+            output = os.path.join(work_dir, f"part_{index:04d}.mp4")
+            scene['normalized_path'] = output
+            cmd = self.normalize_command(scene['path'], output, scene['signature'],
+                                         plan['reference'], encode_args)
+            result = await process_runner.run_ffmpeg(cmd, 'merge_normalize')
+
+            if result.returncode != 0:
+                raise Exception(f"Normalizing {scene['path']} failed: {result.stderr}")
+            return output
+
+        tasks = [
+            asyncio.ensure_future(normalize(index, scene))
+            for index, scene in enumerate(plan['scenes'])
+        ]
+        try:
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            # Stop the other encodes before merge() deletes the parts they write
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
@@ -0,0 +1,72 @@
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+# Frames per second of video that are scored; the frames between are only grabbed
+MOTION_SAMPLE_RATE = 6.0
+
+# Width of the grayscale copies that are compared
+MOTION_WIDTH = 160
+
+# Mean absolute luma change (0-1 of full scale) between samples that counts as motion.
+# Downscaling with INTER_AREA averages sensor noise well below this.
+MOTION_THRESHOLD = 0.02
+
+# Percentile of the curve reported as the scene's motion score
+MOTION_SCORE_PERCENTILE = 90
+
+
+def motion_curve(frames: np.ndarray) -> np.ndarray:
+    """
+    Mean absolute difference (0-1) between consecutive frames of an (N, h, w) stack
+    """
+    if len(frames) < 2:
+        return np.zeros(0, dtype=np.float32)
+
+    stack = frames.astype(np.float32)
+    return np.abs(np.diff(stack, axis=0)).mean(axis=(1, 2)) / 255.0
+
+
+class MotionTracker:
+    """
+    Motion of one decode pass, scored on small grayscale samples
+
+    The caller grabs every frame and retrieves only those for which
+    ``wants`` is true (about MOTION_SAMPLE_RATE per second of video).
+    Each sample is reduced to a MOTION_WIDTH-wide grayscale image; the
+    differences are scored in one batched numpy pass by ``summary``, which
+    is normalized per pixel and therefore independent of the resolution.
+    """
+
+    def __init__(self, fps: float, width: int = MOTION_WIDTH,
+                 sample_rate: float = MOTION_SAMPLE_RATE):
+        self.stride = max(1, int(round(fps / sample_rate)))
+        self.step = self.stride / fps
+        self.width = width
+        self.samples: List[np.ndarray] = []
+
+    def wants(self, position: int) -> bool:
+        return position % self.stride == 0
+
+    def add(self, bgr: np.ndarray):
+        height, width = bgr.shape[:2]
+        if width > self.width:
+            size = (self.width, max(1, round(height * self.width / width)))
+            bgr = cv2.resize(bgr, size, interpolation=cv2.INTER_AREA)
+        self.samples.append(cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY))
+
+    def summary(self, threshold: float = MOTION_THRESHOLD) -> Dict:
+        """
+        has_motion, motion_score (90th percentile of the curve), motion_curve
+        (one value per ``motion_step`` seconds)
+        """
+        curve = motion_curve(np.stack(self.samples)) if len(self.samples) > 1 else np.zeros(0)
+        score = float(np.percentile(curve, MOTION_SCORE_PERCENTILE)) if len(curve) else 0.0
+
+        return {
+            'has_motion': score > threshold,
+            'motion_score': round(score, 4),
+            'motion_curve': [round(float(value), 4) for value in curve],
+            'motion_step': round(self.step, 4)
+        }
@@ -0,0 +1,122 @@
+import os
+import json
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .app_config import settings
+from .ffmpeg_tools import FFmpegTools, ffmpeg_tools
+from .process_runner import process_runner
+
+
+class ProbeCache:
+    """
+    LRU cache of ffprobe results, shared by every probe call site
+
+    Entries are keyed by the file's real path and kind of probe, and carry
+    the file's size and mtime: a file that changed on disk is probed again.
+    Concurrent requests for the same file share one ffprobe run. Cached
+    values are returned as-is, so callers must treat them as read-only.
+    The ffprobe binary comes from ``ffmpeg_tools``, resolved on first probe.
+    """
+
+    def __init__(self, tools: FFmpegTools = ffmpeg_tools, max_entries: int = 256):
+        self.tools = tools
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[Tuple[int, int], Any]]' = OrderedDict()
+        self._inflight: Dict[Tuple[str, str, Tuple[int, int]], asyncio.Future] = {}
+
+    @property
+    def ffprobe_path(self) -> str:
+        return self.tools.ffprobe_path
+
+    def _signature(self, path: str) -> Tuple[int, int]:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    async def get(self, path: str, kind: str, loader: Callable[[str], Awaitable[Any]]) -> Any:
+        """
+        Return the cached ``kind`` result for ``path``, running ``loader`` on a miss
+        """
+        real_path = os.path.realpath(path)
+        signature = self._signature(real_path)
+        key = (real_path, kind)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == signature:
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        inflight_key = (real_path, kind, signature)
+        if inflight_key in self._inflight:
+            return await asyncio.shield(self._inflight[inflight_key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[inflight_key] = future
+        try:
+            value = await loader(real_path)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; don't warn about an unretrieved exception
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            self._store(key, signature, value)
+            return value
+        finally:
+            del self._inflight[inflight_key]
+
+    def _store(self, key: Tuple[str, str], signature: Tuple[int, int], value: Any):
+        self._entries[key] = (signature, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def probe(self, path: str) -> Dict:
+        """
+        Parsed ``ffprobe -show_format -show_streams`` JSON of ``path``
+        """
+        return await self.get(path, 'probe', self._run_probe)
+
+    async def _run_probe(self, path: str) -> Dict:
+        cmd = [
+            self.ffprobe_path,
+            '-v', 'quiet',
+            '-print_format', 'json',
+            '-show_format',
+            '-show_streams',
+            path
+        ]
+
+        result = await process_runner.run(cmd)
+
+        if result.returncode != 0:
+            raise Exception(f"FFprobe failed: {result.stderr}")
+
+        return json.loads(result.stdout)
+
+    def invalidate(self, path: Optional[str] = None):
+        """
+        Drop the entries of ``path``, or everything
+        """
+        if path is None:
+            self._entries.clear()
+            return
+
+        real_path = os.path.realpath(path)
+        for key in [key for key in self._entries if key[0] == real_path]:
+            del self._entries[key]
+
+
+def first_stream(probe: Dict, codec_type: str) -> Optional[Dict]:
+    """
+    First stream of ``codec_type`` ('video', 'audio', ...) in a probe result
+    """
+    return next((stream for stream in probe.get('streams', []) if stream.get('codec_type') == codec_type), None)
+
+# Global instance
+probe_cache = ProbeCache(ffmpeg_tools, settings.PROBE_CACHE_SIZE)
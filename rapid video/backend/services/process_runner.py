@@ -0,0 +1,210 @@
+import time
+import asyncio
+import inspect
+import contextlib
+import subprocess
+from collections import deque
+from typing import AsyncIterator, Deque, List, Optional
+
+from .app_config import settings
+from .ffmpeg_progress import (
+    ProgressCallback, ProgressParser, STDERR_TAIL_LINES, encode_metrics
+)
+
+
+class ProcessTimeoutError(Exception):
+    """Raised when a child process outlives its timeout (it has been killed)"""
+
+
+class ProcessRunner:
+    """
+    Run external tools (ffmpeg, ffprobe) without blocking the event loop
+
+    Children are started with ``asyncio.create_subprocess_exec``. At most
+    ``max_concurrent`` run at once; a timeout or a cancelled caller kills
+    the child and reaps it, so no orphaned encodes keep running.
+
+    A caller that fans one job out over several children (parallel scene
+    splitting) holds a single ``slot()`` for the job and runs its children
+    with ``limited=False`` under its own bound. ffmpeg itself is run with
+    ``run_ffmpeg``, which reports live progress and keeps only a bounded
+    tail of stderr.
+    """
+
+    def __init__(self, max_concurrent: int, default_timeout: Optional[float] = None):
+        self.max_concurrent = max_concurrent
+        self.default_timeout = default_timeout
+        self._semaphore = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it belongs to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphore
+
+    def slot(self) -> asyncio.Semaphore:
+        """
+        One of the ``max_concurrent`` slots, as an async context manager
+        """
+        return self.semaphore
+
+    async def run(self, cmd: List[str], timeout: Optional[float] = None,
+                  input: Optional[bytes] = None, text: bool = True,
+                  limited: bool = True) -> subprocess.CompletedProcess:
+        """
+        Run ``cmd`` to completion and capture its output
+
+        Returns a ``subprocess.CompletedProcess`` like ``subprocess.run(...,
+        capture_output=True)`` so call sites keep checking ``returncode``.
+        ``limited=False`` skips the global limit for callers holding a slot.
+        """
+        timeout = self.default_timeout if timeout is None else timeout
+
+        async with (self.semaphore if limited else contextlib.nullcontext()):
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(input), timeout)
+            except asyncio.TimeoutError:
+                raise ProcessTimeoutError(f"{cmd[0]} timed out after {timeout}s")
+            finally:
+                # Timed out or the awaiting task was cancelled
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+
+        if text:
+            stdout = stdout.decode(errors='replace')
+            stderr = stderr.decode(errors='replace')
+
+        return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+    async def run_ffmpeg(self, cmd: List[str], operation: str = 'ffmpeg',
+                         duration: Optional[float] = None,
+                         on_progress: Optional[ProgressCallback] = None,
+                         timeout: Optional[float] = None,
+                         limited: bool = True) -> subprocess.CompletedProcess:
+        """
+        Run an ffmpeg command, following its ``-progress`` output
+
+        Progress blocks are parsed as they arrive and passed to
+        ``on_progress`` (``percent`` is set when ``duration`` is known).
+        Only the last STDERR_TAIL_LINES lines of stderr are kept, for the
+        error report, instead of the whole log. Wall time, media time and
+        frames of the run are added to ``encode_metrics`` under
+        ``operation``. The result's ``progress`` holds the final snapshot.
+        """
+        timeout = self.default_timeout if timeout is None else timeout
+        cmd = [cmd[0], '-progress', 'pipe:1', '-nostats', *cmd[1:]]
+        stderr_tail: Deque[bytes] = deque(maxlen=STDERR_TAIL_LINES)
+
+        async def follow_progress(stream: asyncio.StreamReader):
+            async for line in stream:
+                snapshot = parser.feed(line.decode(errors='replace'))
+                if snapshot and on_progress:
+                    update = on_progress(snapshot)
+                    if inspect.isawaitable(update):
+                        await update
+
+        async with (self.semaphore if limited else contextlib.nullcontext()):
+            started = time.monotonic()
+            parser = ProgressParser(duration)
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+
+            try:
+                await asyncio.wait_for(asyncio.gather(
+                    follow_progress(process.stdout),
+                    self._tail(process.stderr, stderr_tail),
+                    process.wait()
+                ), timeout)
+            except asyncio.TimeoutError:
+                raise ProcessTimeoutError(f"{cmd[0]} timed out after {timeout}s")
+            finally:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                encode_metrics.record(operation, time.monotonic() - started,
+                                      parser.last, process.returncode == 0)
+
+        stderr = b'\n'.join(stderr_tail).decode(errors='replace')
+        result = subprocess.CompletedProcess(cmd, process.returncode, '', stderr)
+        result.progress = parser.last
+        return result
+
+    async def stream(self, cmd: List[str], record_size: int, timeout: Optional[float] = None,
+                     limited: bool = True) -> AsyncIterator[bytes]:
+        """
+        Run ``cmd`` and yield its stdout in records of ``record_size`` bytes
+
+        Meant for raw media on a pipe (e.g. one or more video frames per
+        record); only the last record may be shorter. Closing the generator
+        early (``contextlib.aclosing``) kills the child. A non-zero exit
+        raises with the tail of stderr.
+        """
+        timeout = self.default_timeout if timeout is None else timeout
+        stderr_tail: Deque[bytes] = deque(maxlen=STDERR_TAIL_LINES)
+
+        async with (self.semaphore if limited else contextlib.nullcontext()):
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout if timeout else None
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+            tail_task = asyncio.ensure_future(self._tail(process.stderr, stderr_tail))
+
+            try:
+                while True:
+                    remaining = deadline - loop.time() if deadline else None
+                    if remaining is not None and remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    try:
+                        record = await asyncio.wait_for(process.stdout.readexactly(record_size), remaining)
+                    except asyncio.IncompleteReadError as e:
+                        if e.partial:
+                            yield e.partial
+                        break
+                    yield record
+
+                await process.wait()
+                await tail_task
+            except asyncio.TimeoutError:
+                raise ProcessTimeoutError(f"{cmd[0]} timed out after {timeout}s")
+            finally:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                tail_task.cancel()
+
+        if process.returncode != 0:
+            stderr = b'\n'.join(stderr_tail).decode(errors='replace')
+            raise Exception(f"{cmd[0]} exited with {process.returncode}: {stderr}")
+
+    async def _tail(self, stream: asyncio.StreamReader, lines: Deque[bytes]):
+        # Read in chunks: ffmpeg may emit very long lines without a newline
+        partial = b''
+        while True:
+            chunk = await stream.read(65536)
+            if not chunk:
+                break
+            *complete, partial = (partial + chunk).split(b'\n')
+            lines.extend(complete)
+            partial = partial[-4096:]
+        if partial:
+            lines.append(partial)
+
+# Global instance
+process_runner = ProcessRunner(settings.MAX_CONCURRENT_JOBS, settings.FFMPEG_TIMEOUT)
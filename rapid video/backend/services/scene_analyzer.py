@@ -0,0 +1,154 @@
+import time
+import asyncio
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from .color_quantizer import color_quantizer
+from .frame_sampler import SampledFrame, sample_points
+from .motion_analyzer import MotionTracker
+from .probe_cache import probe_cache, first_stream
+
+# Width of the downscaled copy used for brightness
+ANALYSIS_WIDTH = 320
+
+
+class SceneAnalyzer:
+    """
+    Motion, brightness, dominant colors and keyframes from one decode
+
+    Per-scene cost: one ffprobe, served by the probe cache when the scene
+    was probed before, and one sequential decode through a single
+    ``cv2.VideoCapture``. Only the keyframes and about MOTION_SAMPLE_RATE
+    frames per second (scored at MOTION_WIDTH, see MotionTracker) are
+    converted; every other frame is only grabbed. Brightness works on a
+    copy at ANALYSIS_WIDTH and colors come from a histogram of a 150x150
+    thumbnail (see ColorQuantizer). ``analysis_cost`` in the result
+    reports the frames decoded and converted and the wall time.
+    """
+
+    def __init__(self, num_keyframes: int = 3, analysis_width: int = ANALYSIS_WIDTH):
+        self.num_keyframes = num_keyframes
+        self.analysis_width = analysis_width
+
+    async def analyze(self, scene_path: str, colors: bool = True) -> Dict:
+        """
+        ``scene_info`` of a scene: duration, fps, resolution, keyframes,
+        has_motion (with motion_score and motion_curve), brightness and
+        dominant_colors (left out with ``colors=False``)
+        """
+        probe = await probe_cache.probe(scene_path)
+        video_stream = first_stream(probe, 'video') or {}
+
+        scene_info = {
+            'duration': float(video_stream.get('duration', 0)),
+            'fps': eval(video_stream.get('r_frame_rate', '30/1')),
+            'resolution': f"{video_stream.get('width')}x{video_stream.get('height')}"
+        }
+
+        scene_info.update(await asyncio.to_thread(
+            self.analyze_frames, scene_path, scene_info['duration'] or None, colors
+        ))
+        return scene_info
+
+    async def analyze_many(self, scene_paths: List[str]) -> List[Dict]:
+        """
+        ``scene_info`` of several scenes, decoded concurrently
+
+        Dominant colors of all scenes are computed as one batched array.
+        Every scene's keyframes stay in memory, so pass a bounded batch.
+        """
+        scene_infos = await asyncio.gather(*(self.analyze(path, colors=False) for path in scene_paths))
+
+        first_frames = [info['keyframes'][0].image if info['keyframes'] else None for info in scene_infos]
+        colors = await asyncio.to_thread(color_quantizer.dominant_colors_batch, first_frames)
+
+        for info, dominant_colors in zip(scene_infos, colors):
+            info['dominant_colors'] = dominant_colors
+        return list(scene_infos)
+
+    def analyze_frames(self, scene_path: str, duration: Optional[float] = None,
+                       colors: bool = True) -> Dict:
+        """
+        The decode pass: keyframes, motion, brightness, dominant_colors
+        """
+        started = time.monotonic()
+        decoded = {}
+        position = 0
+        converted = 0
+
+        cap = cv2.VideoCapture(scene_path)
+        try:
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+            if not duration:
+                duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps
+
+            timestamps, targets = sample_points(duration, fps, self.num_keyframes)
+            wanted = set(targets)
+            motion = MotionTracker(fps)
+
+            while cap.grab():
+                sample_motion = motion.wants(position)
+                if sample_motion or position in wanted:
+                    ok, bgr = cap.retrieve()
+                    if not ok:
+                        break
+                    converted += 1
+
+                    if position in wanted:
+                        decoded[position] = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+                    if sample_motion:
+                        motion.add(bgr)
+
+                position += 1
+
+            keyframes = [
+                SampledFrame(i, timestamp, decoded[target])
+                for i, (timestamp, target) in enumerate(zip(timestamps, targets))
+                if target in decoded
+            ]
+            motion_info = motion.summary()
+
+        except Exception:
+            keyframes = []
+            # Assume motion if detection fails
+            motion_info = {'has_motion': True, 'motion_score': None, 'motion_curve': [], 'motion_step': None}
+
+        finally:
+            cap.release()
+
+        first = keyframes[0].image if keyframes else None
+
+        scene_info = {
+            'keyframes': keyframes,
+            **motion_info,
+            'brightness': self._brightness(first),
+            'analysis_cost': {
+                'frames_decoded': position,
+                'frames_converted': converted
+            }
+        }
+        if colors:
+            scene_info['dominant_colors'] = color_quantizer.dominant_colors(first)
+
+        scene_info['analysis_cost']['seconds'] = round(time.monotonic() - started, 3)
+        return scene_info
+
+    def _downscale(self, image: np.ndarray) -> np.ndarray:
+        height, width = image.shape[:2]
+        if width <= self.analysis_width:
+            return image
+        size = (self.analysis_width, max(1, round(height * self.analysis_width / width)))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    def _brightness(self, frame: Optional[np.ndarray]) -> float:
+        """Average brightness (0-1) of an RGB frame"""
+        if frame is None:
+            return 0.5  # Default brightness
+
+        # Same ITU-R 601 luma weights as PIL's convert('L')
+        return float(cv2.cvtColor(self._downscale(frame), cv2.COLOR_RGB2GRAY).mean() / 255.0)
+
+# Global instance
+scene_analyzer = SceneAnalyzer()
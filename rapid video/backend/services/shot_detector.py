@@ -0,0 +1,171 @@
+import time
+import contextlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .probe_cache import probe_cache, first_stream
+from .process_runner import process_runner
+
+# Size of the grayscale frames ffmpeg decodes to for detection
+DETECT_WIDTH = 64
+DETECT_HEIGHT = 36
+
+# Frames read from the pipe and scored together
+DETECT_BATCH_FRAMES = 64
+
+# Luma histogram bins per frame
+HISTOGRAM_BINS = 16
+
+# Score (0-1) above which a frame starts a new shot
+DEFAULT_CUT_THRESHOLD = 0.15
+
+
+class ShotDetector:
+    """
+    Shot-boundary detection in one streaming pass over a downscaled decode
+
+    ffmpeg decodes the video once and scales it to DETECT_WIDTH x
+    DETECT_HEIGHT grayscale at the source frame rate; the raw frames are
+    read from its stdout in batches of DETECT_BATCH_FRAMES. Each frame is
+    scored against the previous one as the mean of the luma histogram
+    distance and the mean absolute pixel difference (both 0-1), computed
+    for the whole batch at once in numpy, carrying the last frame over
+    to the next batch. Nothing but the frames above the threshold is kept,
+    so memory does not grow with the length of the input.
+    """
+
+    def __init__(self, ffmpeg_path: str = 'ffmpeg', threshold: float = DEFAULT_CUT_THRESHOLD):
+        self.ffmpeg_path = ffmpeg_path
+        self.threshold = threshold
+
+    async def detect(self, input_path: str) -> Dict:
+        """
+        Shot changes of ``input_path`` as (time, score) pairs, with the pass statistics
+        """
+        probe = await probe_cache.probe(input_path)
+        video_stream = first_stream(probe, 'video') or {}
+        duration = float(probe.get('format', {}).get('duration', 0) or 0)
+        fps = self._frame_rate(video_stream)
+
+        cmd = [
+            self.ffmpeg_path,
+            '-v', 'error',
+            '-i', input_path,
+            '-map', '0:v:0',
+            '-vf', f"fps={fps},scale={DETECT_WIDTH}:{DETECT_HEIGHT},format=gray",
+            '-f', 'rawvideo',
+            'pipe:1'
+        ]
+
+        frame_size = DETECT_WIDTH * DETECT_HEIGHT
+        shot_changes: List[Tuple[float, float]] = []
+        previous = None
+        frames = 0
+        started = time.monotonic()
+
+        batches = process_runner.stream(cmd, frame_size * DETECT_BATCH_FRAMES)
+        async with contextlib.aclosing(batches):
+            async for chunk in batches:
+                count = len(chunk) // frame_size
+                if not count:
+                    continue
+                batch = np.frombuffer(chunk, dtype=np.uint8, count=count * frame_size)
+                batch = batch.reshape(count, DETECT_HEIGHT, DETECT_WIDTH)
+
+                scores, previous = self.score_batch(batch, previous)
+                for offset in np.flatnonzero(scores > self.threshold):
+                    # scores[i] compares frame (frames + i) with the one before it
+                    shot_changes.append((float(frames + offset) / fps, float(scores[offset])))
+                frames += count
+
+        elapsed = time.monotonic() - started
+        media_seconds = duration or frames / fps
+
+        return {
+            'duration': media_seconds,
+            'fps': fps,
+            'frames': frames,
+            'shot_changes': [
+                (round(t, 3), round(score, 4)) for t, score in shot_changes if t > 0
+            ],
+            'seconds': round(elapsed, 3),
+            'realtime_factor': round(media_seconds / elapsed, 2) if elapsed else None
+        }
+
+    def score_batch(self, batch: np.ndarray,
+                    previous: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Change score of every frame in ``batch`` against the frame before it
+
+        ``previous`` is the last frame of the previous batch (None for the
+        first batch, whose first frame scores 0). Returns the scores and the
+        frame to carry over.
+        """
+        stack = batch if previous is None else np.concatenate([previous[None], batch])
+        count = stack.shape[0]
+        pixels = stack.shape[1] * stack.shape[2]
+
+        # One bincount for all histograms: frame i uses bins [i * B, (i + 1) * B)
+        shift = 8 - int(np.log2(HISTOGRAM_BINS))
+        index = (stack.reshape(count, -1) >> shift).astype(np.int64)
+        index += np.arange(count, dtype=np.int64)[:, None] * HISTOGRAM_BINS
+        histograms = np.bincount(index.ravel(), minlength=count * HISTOGRAM_BINS)
+        histograms = histograms.reshape(count, HISTOGRAM_BINS) / pixels
+
+        histogram_distance = 0.5 * np.abs(np.diff(histograms, axis=0)).sum(axis=1)
+        pixel_difference = np.abs(np.diff(stack.astype(np.int16), axis=0)).mean(axis=(1, 2)) / 255.0
+        scores = 0.5 * (histogram_distance + pixel_difference)
+
+        if previous is None:
+            scores = np.concatenate([[0.0], scores])
+
+        return scores, stack[-1].copy()
+
+    def _frame_rate(self, video_stream: Dict) -> float:
+        for key in ('avg_frame_rate', 'r_frame_rate'):
+            numerator, _, denominator = str(video_stream.get(key, '')).partition('/')
+            try:
+                rate = float(numerator) / float(denominator or 1)
+            except (ValueError, ZeroDivisionError):
+                continue
+            if rate > 0:
+                return rate
+        return 30.0
+
+
+def scene_boundaries(shot_changes: List[Tuple[float, float]], duration: float,
+                     min_length: float, max_length: float) -> List[float]:
+    """
+    Scene cut points (excluding 0 and ``duration``) snapped to shot changes
+
+    From each cut, the strongest shot change between ``min_length`` and
+    ``max_length`` later becomes the next cut. Without one, a scene longer
+    than ``max_length`` is cut at ``max_length`` (or the rest is halved, so
+    the last scene is not shorter than ``min_length``). No cut leaves less
+    than ``min_length`` before the end. Every cut lies after the previous
+    one, so ``min_length`` of 0 still terminates.
+    """
+    cuts = []
+    last = 0.0
+
+    while True:
+        window = [
+            (t, score) for t, score in shot_changes
+            if t > last and last + min_length <= t <= min(last + max_length, duration - min_length)
+        ]
+
+        if window:
+            cut = max(window, key=lambda change: change[1])[0]
+        elif duration - last > max_length:
+            if duration - (last + max_length) >= min_length:
+                cut = last + max_length
+            else:
+                cut = last + (duration - last) / 2
+        else:
+            break
+
+        cuts.append(cut)
+        last = cut
+
+    return cuts
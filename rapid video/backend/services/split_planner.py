@@ -0,0 +1,338 @@
+import os
+import math
+import bisect
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .probe_cache import probe_cache
+from .process_runner import process_runner
+
+# How far (seconds) a cut may move from its nominal boundary to land on a keyframe
+DEFAULT_KEYFRAME_TOLERANCE = 0.5
+
+# Video codecs that can be stream-copied into the .mp4 scene files
+COPYABLE_CODECS = {'h264', 'hevc', 'mpeg4', 'av1'}
+
+# Re-encode settings matching the existing libx264 scene splits
+DEFAULT_ENCODE_ARGS = ['-c:v', 'libx264', '-c:a', 'aac', '-preset', 'fast', '-crf', '23']
+
+# Nudge past a keyframe's timestamp so input seeking never lands on the previous one
+SEEK_EPSILON = 0.001
+
+# Accurate seeks stop the input-side jump this many seconds early and trim the rest
+FINE_SEEK_WINDOW = 2.0
+
+# A copied segment may end this early (share of segment_duration) to land on a keyframe
+MIN_COPY_FRACTION = 0.5
+
+
+def default_split_workers() -> int:
+    """One segment encode per CPU core"""
+    return os.cpu_count() or 1
+
+
+def seek_arguments(start: float, accurate: bool = True) -> Tuple[List[str], List[str]]:
+    """
+    (input-side, output-side) ffmpeg arguments that seek to ``start``
+
+    The input-side ``-ss`` jumps through the container index, so the cost
+    no longer grows with the position in the file. A fast seek starts at
+    the keyframe at or before ``start``; an accurate seek jumps to just
+    before it and trims the last ``FINE_SEEK_WINDOW`` seconds on the
+    output side, landing on the exact frame.
+    """
+    if start <= 0:
+        return [], []
+
+    if not accurate:
+        return ['-noaccurate_seek', '-ss', f"{start:.6f}"], []
+
+    coarse = max(0.0, start - FINE_SEEK_WINDOW)
+    input_args = ['-ss', f"{coarse:.6f}"] if coarse > 0 else []
+    return input_args, ['-ss', f"{start - coarse:.6f}"]
+
+
+class SplitPlanner:
+    """
+    Keyframe-aware planning of fixed-length video splits.
+
+    The keyframe index is read once with ffprobe (packet flags only, nothing
+    is decoded). Each nominal boundary snaps to the latest keyframe within
+    the tolerance that keeps the segment within its length; a segment that
+    starts and ends on keyframes is cut with ``-c copy``, and only segments
+    touching an off-keyframe boundary are re-encoded.
+    """
+
+    def __init__(self, ffmpeg_path: str = 'ffmpeg', ffprobe_path: str = 'ffprobe',
+                 accurate: bool = True):
+        self.ffmpeg_path = ffmpeg_path
+        self.ffprobe_path = ffprobe_path
+        # Frame-accurate starts for re-encoded segments (see seek_arguments)
+        self.accurate = accurate
+
+    async def read_keyframes(self, input_path: str) -> Tuple[List[float], float, str]:
+        """
+        Return (keyframe times, duration, video codec) of the first video stream
+        """
+        return await probe_cache.get(input_path, 'keyframes', self._read_keyframes)
+
+    async def _read_keyframes(self, input_path: str) -> Tuple[List[float], float, str]:
+        cmd = [
+            self.ffprobe_path,
+            '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,flags:stream=codec_name:format=duration,start_time',
+            '-of', 'csv',
+            input_path
+        ]
+
+        result = await process_runner.run(cmd)
+
+        if result.returncode != 0:
+            raise Exception(f"Keyframe probe failed: {result.stderr}")
+
+        keyframes = []
+        duration = 0.0
+        start_time = 0.0
+        codec = ''
+
+        for line in result.stdout.splitlines():
+            fields = line.strip().split(',')
+            section = fields[0]
+
+            if section == 'packet' and len(fields) >= 3:
+                if 'K' in fields[2] and fields[1] not in ('', 'N/A'):
+                    keyframes.append(float(fields[1]))
+            elif section == 'stream' and len(fields) >= 2:
+                codec = fields[1]
+            elif section == 'format' and len(fields) >= 3:
+                # ffprobe prints its own field order: start_time before duration
+                start_time = float(fields[1]) if fields[1] not in ('', 'N/A') else 0.0
+                duration = float(fields[2]) if fields[2] not in ('', 'N/A') else 0.0
+
+        # Seek positions are relative to the container start time
+        keyframes = sorted(max(0.0, k - start_time) for k in keyframes)
+
+        return keyframes, duration, codec
+
+    def plan(self, keyframes: List[float], duration: float, segment_duration: float,
+             tolerance: float = DEFAULT_KEYFRAME_TOLERANCE, copyable: bool = True,
+             boundaries: Optional[List[float]] = None) -> List[Dict]:
+        """
+        Choose cut points and a split mode ('copy' or 'encode') per segment
+
+        The nominal cut points are every ``segment_duration`` seconds, or
+        ``boundaries`` (e.g. detected shot changes) when given. No segment
+        runs longer than ``segment_duration``.
+        """
+        if duration <= 0:
+            raise Exception(f"Cannot split a video of duration {duration}")
+        if segment_duration <= 0:
+            raise Exception(f"Segment duration must be positive, got {segment_duration}")
+
+        cuts = [0.0]
+        on_keyframe = [bool(keyframes) and keyframes[0] <= SEEK_EPSILON]
+
+        if boundaries is None:
+            self._plan_grid(keyframes, duration, segment_duration, tolerance, cuts, on_keyframe)
+        else:
+            self._plan_boundaries(keyframes, duration, segment_duration, tolerance,
+                                  boundaries, cuts, on_keyframe)
+
+        segments = []
+        for i, start in enumerate(cuts):
+            end = cuts[i + 1] if i + 1 < len(cuts) else duration
+            ends_cleanly = on_keyframe[i + 1] if i + 1 < len(cuts) else True
+
+            segments.append({
+                'index': i,
+                'start_time': start,
+                'duration': end - start,
+                'mode': 'copy' if copyable and on_keyframe[i] and ends_cleanly else 'encode'
+            })
+
+        return segments
+
+    def _plan_grid(self, keyframes: List[float], duration: float, segment_duration: float,
+                   tolerance: float, cuts: List[float], on_keyframe: List[bool]):
+        """
+        Fixed-length cuts, each ending on a keyframe wherever one allows it
+
+        A segment ends on the latest keyframe within ``tolerance`` of its
+        grid point (a multiple of ``segment_duration``), so snapping never
+        moves the grid itself. When that would run past ``segment_duration``
+        (the GOP doesn't line up with the grid), it ends on the latest
+        keyframe in the second half of its span instead and is still copied.
+        Only a stretch with no usable keyframe at all is re-encoded, split
+        evenly up to the next keyframe so the segments after it copy again.
+        """
+        while duration - cuts[-1] > segment_duration + SEEK_EPSILON:
+            start = cuts[-1]
+            limit = start + segment_duration
+
+            grid_point = math.floor((limit + tolerance) / segment_duration) * segment_duration
+            cut = None
+            if grid_point - tolerance > start + segment_duration * MIN_COPY_FRACTION:
+                cut = self._latest(keyframes, grid_point - tolerance,
+                                   min(grid_point + tolerance, limit))
+            if cut is None:
+                cut = self._latest(keyframes, start + segment_duration * MIN_COPY_FRACTION, limit)
+
+            if cut is not None:
+                cuts.append(cut)
+                on_keyframe.append(True)
+                continue
+
+            # No keyframe to end on: re-encode evenly up to the next one
+            position = bisect.bisect_right(keyframes, limit + SEEK_EPSILON)
+            resume = keyframes[position] if position < len(keyframes) else duration
+            if resume >= duration - SEEK_EPSILON:
+                break
+
+            pieces = math.ceil((resume - start) / segment_duration - SEEK_EPSILON)
+            for piece in range(1, pieces):
+                cuts.append(start + (resume - start) * piece / pieces)
+                on_keyframe.append(False)
+            cuts.append(resume)
+            on_keyframe.append(True)
+
+        self._split_tail(duration, segment_duration, cuts, on_keyframe)
+
+    def _plan_boundaries(self, keyframes: List[float], duration: float, segment_duration: float,
+                         tolerance: float, boundaries: List[float],
+                         cuts: List[float], on_keyframe: List[bool]):
+        """
+        Cuts at the given boundaries, snapped to a keyframe within ``tolerance``
+        """
+        for boundary in sorted(b for b in boundaries if 0 < b < duration):
+            limit = cuts[-1] + segment_duration
+            snapped = self._latest(keyframes, boundary - tolerance, min(boundary + tolerance, limit))
+
+            if snapped is not None and cuts[-1] < snapped < duration:
+                cuts.append(snapped)
+                on_keyframe.append(True)
+            elif min(boundary, limit) > cuts[-1]:
+                # Over the limit the cut comes early, off-keyframe
+                cuts.append(min(boundary, limit))
+                on_keyframe.append(False)
+
+        self._split_tail(duration, segment_duration, cuts, on_keyframe)
+
+    def _split_tail(self, duration: float, segment_duration: float,
+                    cuts: List[float], on_keyframe: List[bool]):
+        """
+        Split an over-long last segment evenly rather than leaving a sliver at the end
+        """
+        tail = duration - cuts[-1]
+        pieces = math.ceil((tail - SEEK_EPSILON) / segment_duration)
+        last = cuts[-1]
+        for piece in range(1, pieces):
+            cuts.append(last + tail * piece / pieces)
+            on_keyframe.append(False)
+
+    def _latest(self, keyframes: List[float], low: float, high: float) -> Optional[float]:
+        """
+        Latest keyframe in [low, high], allowing for float rounding
+        """
+        position = bisect.bisect_right(keyframes, high + SEEK_EPSILON)
+        if position and keyframes[position - 1] >= low - SEEK_EPSILON:
+            return keyframes[position - 1]
+        return None
+
+    async def plan_split(self, input_path: str, segment_duration: float,
+                         tolerance: float = DEFAULT_KEYFRAME_TOLERANCE,
+                         boundaries: Optional[List[float]] = None) -> List[Dict]:
+        """
+        Read the keyframe index of ``input_path`` and plan its split
+        """
+        keyframes, duration, codec = await self.read_keyframes(input_path)
+        return self.plan(keyframes, duration, segment_duration, tolerance,
+                         copyable=codec in COPYABLE_CODECS, boundaries=boundaries)
+
+    def build_command(self, input_path: str, output_file: str, segment: Dict,
+                      encode_args: Optional[List[str]] = None,
+                      threads: Optional[int] = None) -> List[str]:
+        """
+        ffmpeg command that cuts one planned segment
+        """
+        if segment['mode'] == 'copy':
+            # A stream copy always starts on the keyframe before the seek point
+            seek = segment['start_time'] + SEEK_EPSILON if segment['start_time'] > 0 else 0.0
+            input_args, output_args = ['-ss', f"{seek:.6f}"], []
+            codec_args = ['-c', 'copy', '-avoid_negative_ts', 'make_zero']
+        else:
+            input_args, output_args = seek_arguments(segment['start_time'], self.accurate)
+            codec_args = list(encode_args or DEFAULT_ENCODE_ARGS)
+            if threads:
+                codec_args += ['-threads', str(threads)]
+
+        return [
+            self.ffmpeg_path,
+            *input_args,
+            '-i', input_path,
+            *output_args,
+            '-t', f"{segment['duration']:.6f}",
+            *codec_args,
+            '-y',
+            output_file
+        ]
+
+    async def cut_segment(self, input_path: str, output_file: str, segment: Dict,
+                          encode_args: Optional[List[str]] = None,
+                          threads: Optional[int] = None, limited: bool = True) -> Dict:
+        """
+        Cut one planned segment, re-encoding it if a stream copy fails
+        """
+        cmd = self.build_command(input_path, output_file, segment, encode_args, threads)
+        result = await process_runner.run_ffmpeg(cmd, 'split_segment', limited=limited)
+
+        if result.returncode != 0 and segment['mode'] == 'copy':
+            # e.g. an audio codec the mp4 muxer refuses to copy
+            segment = dict(segment, mode='encode')
+            cmd = self.build_command(input_path, output_file, segment, encode_args, threads)
+            result = await process_runner.run_ffmpeg(cmd, 'split_segment', limited=limited)
+
+        if result.returncode != 0:
+            raise Exception(f"Segment {segment['index']} failed: {result.stderr}")
+
+        return dict(segment, file_path=output_file, size=os.path.getsize(output_file))
+
+    async def cut_segments(self, input_path: str, plan: List[Dict], output_files: List[str],
+                           workers: Optional[int] = None,
+                           encode_args: Optional[List[str]] = None,
+                           on_segment: Optional[Callable[[Dict], Awaitable[None]]] = None) -> List[Dict]:
+        """
+        Cut every planned segment, up to ``workers`` ffmpeg processes at once
+
+        Each cut seeks on the input side, so segments are independent and
+        none decodes from the start of the file. The whole split counts as
+        one job against the global process limit, and the CPU cores are
+        shared between the concurrent encodes through ``-threads``. Results
+        come back in plan order whatever order the encodes finish in;
+        ``on_segment`` is awaited as each one completes.
+        """
+        workers = max(1, min(workers or default_split_workers(), len(plan) or 1))
+        threads = max(1, (os.cpu_count() or 1) // workers) if workers > 1 else None
+        bound = asyncio.Semaphore(workers)
+
+        async def cut(segment: Dict, output_file: str) -> Dict:
+            async with bound:
+                result = await self.cut_segment(input_path, output_file, segment,
+                                                encode_args, threads, limited=False)
+            if on_segment:
+                await on_segment(result)
+            return result
+
+        async with process_runner.slot():
+            tasks = [
+                asyncio.ensure_future(cut(segment, output_file))
+                for segment, output_file in zip(plan, output_files)
+            ]
+            try:
+                return list(await asyncio.gather(*tasks))
+            except BaseException:
+                # One failed (or we were cancelled): kill the encodes still running
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
@@ -0,0 +1,98 @@
+import pytest
+
+from services.split_planner import SplitPlanner
+
+
+def keyframe_grid(interval, duration):
+    return [k * interval for k in range(int(duration / interval) + 1)]
+
+
+def assert_contiguous(plan, duration, segment_duration):
+    position = 0.0
+    for segment in plan:
+        assert segment['start_time'] == pytest.approx(position)
+        assert 0 < segment['duration'] <= segment_duration + 1e-6
+        position += segment['duration']
+    assert position == pytest.approx(duration)
+
+
+@pytest.mark.parametrize('interval', [1.001, 2.002, 0.5005])
+def test_ntsc_gops_are_copied_within_the_limit(interval):
+    keyframes = keyframe_grid(interval, 180.0)
+
+    plan = SplitPlanner().plan(keyframes, 180.0, 8.0, 0.5)
+
+    assert_contiguous(plan, 180.0, 8.0)
+    assert all(segment['mode'] == 'copy' for segment in plan)
+
+
+def test_aligned_keyframes_stay_on_the_grid():
+    plan = SplitPlanner().plan(keyframe_grid(2.0, 180.0), 180.0, 8.0, 0.5)
+
+    assert [segment['start_time'] for segment in plan] == pytest.approx(
+        [8.0 * i for i in range(23)]
+    )
+    assert all(segment['mode'] == 'copy' for segment in plan)
+
+
+def test_early_snap_does_not_drag_later_cuts():
+    keyframes = [0.0, 7.8, 8.2, 10.0, 12.0, 14.0, 15.8, 16.0, 18.0, 20.0]
+
+    plan = SplitPlanner().plan(keyframes, 20.0, 8.0, 0.5)
+
+    assert [segment['start_time'] for segment in plan] == pytest.approx([0.0, 7.8, 15.8])
+    assert all(segment['mode'] == 'copy' for segment in plan)
+
+
+def test_sparse_keyframes_only_reencode_the_gap():
+    keyframes = [0.0, 7.8, 16.1, 24.1, 32.0, 40.3]
+
+    plan = SplitPlanner().plan(keyframes, 45.0, 8.0, 0.5)
+
+    assert_contiguous(plan, 45.0, 8.0)
+    copied = [segment['start_time'] for segment in plan if segment['mode'] == 'copy']
+    assert copied == pytest.approx([0.0, 16.1, 24.1, 40.3])
+
+
+def test_without_keyframes_everything_is_encoded():
+    plan = SplitPlanner().plan([], 30.0, 8.0, 0.5)
+
+    assert_contiguous(plan, 30.0, 8.0)
+    assert all(segment['mode'] == 'encode' for segment in plan)
+
+
+def test_uncopyable_codec_is_encoded():
+    plan = SplitPlanner().plan(keyframe_grid(2.0, 24.0), 24.0, 8.0, 0.5, copyable=False)
+
+    assert all(segment['mode'] == 'encode' for segment in plan)
+
+
+def test_boundaries_snap_to_the_latest_keyframe_within_the_limit():
+    keyframes = [0.0, 5.9, 6.0, 8.1, 14.0]
+
+    plan = SplitPlanner().plan(keyframes, 16.0, 8.0, 0.2, boundaries=[6.0, 14.1])
+
+    assert [segment['start_time'] for segment in plan] == pytest.approx([0.0, 6.0, 14.0])
+    assert all(segment['mode'] == 'copy' for segment in plan)
+
+
+def test_boundary_snap_past_the_limit_cuts_early():
+    keyframes = [0.0, 8.3]
+
+    plan = SplitPlanner().plan(keyframes, 12.0, 8.0, 0.5, boundaries=[8.2])
+
+    assert plan[0]['duration'] == pytest.approx(8.0)
+    assert plan[0]['mode'] == 'encode'
+
+
+def test_long_tail_is_split_evenly():
+    plan = SplitPlanner().plan([0.0, 7.6], 16.0, 8.0, 0.5)
+
+    assert_contiguous(plan, 16.0, 8.0)
+    assert [segment['duration'] for segment in plan[1:]] == pytest.approx([4.2, 4.2])
+
+
+@pytest.mark.parametrize('duration', [0.0, -1.0])
+def test_empty_duration_is_rejected(duration):
+    with pytest.raises(Exception):
+        SplitPlanner().plan([0.0], duration, 8.0)